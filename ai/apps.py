@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "ai"
+
+    def ready(self):
+        if settings.CLIENT_REGISTRY_WARMUP:
+            from ai.clients import clients
+
+            clients.warm()
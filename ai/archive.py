@@ -0,0 +1,121 @@
+import logging
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+
+from ai.models import ArchivedConvSession, ConversationSummary, OpenAiConvSession
+
+logger = logging.getLogger(__name__)
+
+
+def month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def next_month(value: date) -> date:
+    if value.month == 12:
+        return date(value.year + 1, 1, 1)
+    return date(value.year, value.month + 1, 1)
+
+
+def ensure_partition(period: date):
+    """
+    Create the monthly archive partition on PostgreSQL, rows land in the
+    default partition if it cannot be created
+    """
+    if connection.vendor != "postgresql":
+        return
+
+    table = ArchivedConvSession._meta.db_table
+    partition = f"{table}_p{period:%Y%m}"
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS "{partition}" PARTITION OF "{table}" '
+                "FOR VALUES FROM (%s) TO (%s)",
+                [period, next_month(period)],
+            )
+    except DatabaseError:
+        logger.warning("Could not create archive partition %s", partition)
+
+
+def archive_user_sessions(
+    user: str, cutoff: datetime, batch_size: int, keep_turns: int
+) -> int:
+    """
+    Move one user's cold sessions into compressed monthly archive rows.
+    The newest `keep_turns` sessions and every session not yet folded into
+    the conversation summary always stay in the hot table.
+    """
+    boundary = list(
+        OpenAiConvSession.objects.filter(user=user)
+        .order_by("-created_date", "-id")
+        .values_list("id", flat=True)[keep_turns - 1 : keep_turns]
+    )
+    if not boundary:
+        return 0
+    summarized = (
+        ConversationSummary.objects.filter(user=user)
+        .values_list("last_session_id", flat=True)
+        .first()
+    )
+    boundary = min(boundary[0], (summarized or 0) + 1)
+
+    archived = 0
+    while True:
+        sessions = list(
+            OpenAiConvSession.objects.filter(
+                user=user, created_date__lt=cutoff, id__lt=boundary
+            )
+            .order_by("id")
+            .values("id", "role", "message", "created_date")[:batch_size]
+        )
+        if not sessions:
+            return archived
+
+        buckets: dict[date, list[dict]] = {}
+        for session in sessions:
+            buckets.setdefault(month_start(session["created_date"]), []).append(session)
+
+        for period in buckets:
+            ensure_partition(period)
+
+        with transaction.atomic():
+            ArchivedConvSession.objects.bulk_create(
+                [
+                    ArchivedConvSession(
+                        user=user,
+                        period=period,
+                        first_session_id=rows[0]["id"],
+                        last_session_id=rows[-1]["id"],
+                        row_count=len(rows),
+                        payload=ArchivedConvSession.compress(rows),
+                    )
+                    for period, rows in buckets.items()
+                ]
+            )
+            OpenAiConvSession.objects.filter(
+                id__in=[session["id"] for session in sessions]
+            ).delete()
+
+        archived += len(sessions)
+
+
+def archive_cold_sessions(
+    cutoff: datetime, batch_size: int = 1000, keep_turns: int = None
+) -> int:
+    """
+    Archive sessions older than `cutoff` for every user, returns rows moved
+    """
+    keep_turns = keep_turns or settings.CONTEXT_MAX_TURNS
+    users = (
+        OpenAiConvSession.objects.filter(created_date__lt=cutoff)
+        .values_list("user", flat=True)
+        .distinct()
+    )
+
+    archived = 0
+    for user in list(users):
+        archived += archive_user_sessions(user, cutoff, batch_size, keep_turns)
+    return archived
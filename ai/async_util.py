@@ -0,0 +1,616 @@
+import asyncio
+import io
+import json
+import logging
+from typing import Literal
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from google.auth.transport.requests import Request
+from openai import AsyncOpenAI
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from ai.audio_store import audio_store
+from ai.briefings import aget_briefing
+from ai.clients import clients
+from ai.context import ConversationContext
+from ai.fuel_stations import fuel_stations
+from ai.language_detection import (
+    detect_local,
+    language_from_name,
+    normalize_language,
+    should_detect,
+)
+from ai.models import Languages, OpenAiConvSession, SessionRole
+from ai.places import places_cache
+from ai.preferences import aget_user_language, aset_user_language
+from ai.routing import route_planner
+from ai.streaming import SentenceChunker, ToolCallCollector
+from ai.translation_memory import translation_memory
+from ai.util import AudioTranscript, ConversationUtil, TranslationTranscriptionUtil
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTranslationTranscriptionUtil(TranslationTranscriptionUtil):
+    """
+    Non-blocking variant of TranslationTranscriptionUtil, Google Translate is
+    called through its REST API so no request holds a thread
+    """
+
+    open_ai_client: AsyncOpenAI
+    http_client: httpx.AsyncClient
+
+    TRANSLATE_URL = "https://translation.googleapis.com/language/translate/v2"
+
+    def __init__(self):
+        self.open_ai_client = clients.async_openai()
+        self.http_client = clients.async_http()
+        self.credentials = clients.google_credentials()
+
+    async def _auth_headers(self) -> dict:
+        if not self.credentials.valid:
+            # google-auth only ships a blocking transport, refresh off the loop
+            await asyncio.to_thread(self.credentials.refresh, Request())
+        return {"Authorization": f"Bearer {self.credentials.token}"}
+
+    async def _detect_language(self, content: str):
+        response = await self.http_client.post(
+            f"{self.TRANSLATE_URL}/detect",
+            json={"q": content},
+            headers=await self._auth_headers(),
+        )
+        response.raise_for_status()
+        detections = response.json()["data"]["detections"]
+        detected_lang = detections[0][0].get("language", "en")
+        if "-" in detected_lang:
+            detected_lang = detected_lang.split("-")[0]
+        return detected_lang
+
+    async def detect_language(self, content: str) -> str | None:
+        if not should_detect(content):
+            return None
+
+        language, confidence = detect_local(content)
+        if confidence >= settings.LANGUAGE_DETECTION_CONFIDENCE:
+            return language
+
+        return normalize_language(await self._detect_language(content))
+
+    async def _transcribe(self, audio: io.BytesIO) -> str:
+        transcription = await self.open_ai_client.audio.transcriptions.create(
+            file=audio, **self.TRANSCRIPTION_SETTINGS
+        )
+        return transcription.text
+
+    async def _transcribe_verbose(self, path: str) -> tuple[str, str | None]:
+        with open(path, "rb") as audio:
+            transcription = await self.open_ai_client.audio.transcriptions.create(
+                file=audio,
+                response_format="verbose_json",
+                **self.TRANSCRIPTION_SETTINGS,
+            )
+        return transcription.text, language_from_name(transcription.language)
+
+    async def _translate_audio(self, path: str) -> str:
+        with open(path, "rb") as audio:
+            translation = await self.open_ai_client.audio.translations.create(
+                file=audio, **self.TRANSCRIPTION_SETTINGS
+            )
+        return translation.text
+
+    async def transcribe_audio(self, path: str) -> AudioTranscript:
+        if not settings.WHISPER_TRANSLATE:
+            text, language = await self._transcribe_verbose(path)
+            return AudioTranscript(text, language, text if language == "en" else None)
+
+        (text, language), translation = await asyncio.gather(
+            self._transcribe_verbose(path), self._translate_audio(path)
+        )
+        return AudioTranscript(
+            text, language, text if language == "en" else translation
+        )
+
+    async def _translate_batch(
+        self, segments: list[str], source_lang: str, destination_lang: str
+    ) -> list[str]:
+        texts = list(dict.fromkeys(segment for segment in segments if segment))
+        translations = await translation_memory.aget_many(
+            texts, source_lang, destination_lang
+        )
+
+        missing = [text for text in texts if text not in translations]
+        if missing:
+            response = await self.http_client.post(
+                self.TRANSLATE_URL,
+                json={
+                    "q": missing,
+                    "source": source_lang,
+                    "target": destination_lang,
+                },
+                headers=await self._auth_headers(),
+            )
+            response.raise_for_status()
+            new_translations = {
+                text: result["translatedText"]
+                for text, result in zip(
+                    missing, response.json()["data"]["translations"]
+                )
+            }
+            await translation_memory.aset_many(
+                new_translations, source_lang, destination_lang
+            )
+            translations.update(new_translations)
+
+        return [translations.get(segment, segment) for segment in segments]
+
+    async def _translate(
+        self, source_text: str, source_lang: str, destination_lang: str
+    ) -> str:
+        return (
+            await self._translate_batch([source_text], source_lang, destination_lang)
+        )[0]
+
+    async def _generate_audio(self, input: str, language: str = None):
+        file_path = audio_store.lookup(input, language=language, **self.SPEECH_SETTINGS)
+        if file_path:
+            return file_path
+
+        temp_path = audio_store.temp_path()
+        try:
+            async with self.open_ai_client.audio.speech.with_streaming_response.create(
+                **self.SPEECH_SETTINGS, input=input
+            ) as response:
+                await response.stream_to_file(temp_path)
+        except BaseException:
+            audio_store.discard(temp_path)
+            raise
+        return await sync_to_async(audio_store.commit)(
+            temp_path, input, language=language, **self.SPEECH_SETTINGS
+        )
+
+    async def speech_to_speech(
+        self, audio: io.BytesIO | str, source_lang: str, destination_lang: str
+    ):
+        if isinstance(audio, str):
+            with open(audio, "rb") as audio_file:
+                transcribed_text = await self._transcribe(audio_file)
+        else:
+            transcribed_text = await self._transcribe(audio)
+        translated_text = await self._translate(
+            transcribed_text, source_lang, destination_lang
+        )
+        return await self._generate_audio(translated_text, destination_lang)
+
+    async def text_to_text(
+        self, input_text: str, source_lang: str, destination_lang: str
+    ):
+        return await self._translate(input_text, source_lang, destination_lang)
+
+
+class AsyncConversationUtil(ConversationUtil):
+    """
+    Non-blocking variant of ConversationUtil for the ASGI webhook.
+    Build instances with `await AsyncConversationUtil.create(user)`.
+    """
+
+    open_ai_client: AsyncOpenAI
+    translation_util: AsyncTranslationTranscriptionUtil
+
+    def __init__(self, user: str):
+        self.open_ai_client = clients.async_openai()
+        self.google_maps_api_key = settings.GOOGLE_MAPS_API_KEY
+        self.fuel_origin = None
+        self.fuel_destination = None
+        self.user = user
+        self.messages = []
+        self.pending_history: list[OpenAiConvSession] = []
+        self.prefetched_places: dict[tuple, list[dict]] = {}
+        self.http_client = clients.async_http()
+        self.translation_util = AsyncTranslationTranscriptionUtil()
+
+    @classmethod
+    async def create(cls, user: str) -> "AsyncConversationUtil":
+        util = cls(user)
+        await util._init_session()
+        return util
+
+    async def _init_session(self):
+        self.context = ConversationContext(self.user)
+        self.messages = await self.context.aload()
+
+    async def _process_tool_call(self, tool_call: ChatCompletionMessageToolCall):
+        """
+        Call corresponding handler function for tool calls
+        """
+
+        function_name = tool_call.function.name
+        handler = getattr(self, f"handle_{function_name}", None)
+
+        if not handler:
+            logger.error(
+                "Tool call not defined, returning generic message",
+                extra={"tool_call": tool_call, "user": self.user},
+            )
+            return ""
+
+        return await handler(**json.loads(tool_call.function.arguments))
+
+    async def _process_tool_calls(
+        self, tool_calls: list[ChatCompletionMessageToolCall]
+    ):
+        await self._prefetch_places(tool_calls)
+        semaphore = asyncio.Semaphore(settings.TOOL_CALL_CONCURRENCY)
+
+        async def run(tool_call: ChatCompletionMessageToolCall):
+            async with semaphore:
+                return await self._process_tool_call(tool_call)
+
+        results = await asyncio.gather(*[run(tool_call) for tool_call in tool_calls])
+        return "\n\n".join(result for result in results if result)
+
+    async def _prefetch_places(self, tool_calls: list[ChatCompletionMessageToolCall]):
+        for origin, destination, arguments in self._corridor_requests(tool_calls):
+            max_diesel_price, count = (
+                arguments.get("max_diesel_price"),
+                arguments.get("count"),
+            )
+            gas_stations, repair_stations = await self.find_gas_and_repair_stations(
+                origin, destination, max_diesel_price, count
+            )
+            self.prefetched_places[
+                self._places_key(
+                    "gas_station", origin, destination, max_diesel_price, count
+                )
+            ] = gas_stations
+            self.prefetched_places[
+                self._places_key("car_repair", origin, destination)
+            ] = repair_stations
+
+    async def _update_session_history(
+        self,
+        content: str | None,
+        role: SessionRole,
+    ):
+        """
+        Update session history, rows are written by `flush_session_history`
+        """
+        if not content:
+            return
+
+        self.pending_history.append(
+            OpenAiConvSession(user=self.user, message=content, role=role.value)
+        )
+
+        self.messages.append({"role": role.value, "content": content})
+
+    async def flush_session_history(self) -> int:
+        rows, self.pending_history = self.pending_history, []
+        if rows:
+            await OpenAiConvSession.objects.abulk_create(rows)
+        return len(rows)
+
+    async def _get_gpt_response(self):
+        """
+        Get ai response based on the chat history
+        """
+
+        return await self.open_ai_client.chat.completions.create(
+            **self._completion_options()
+        )
+
+    async def _stream_gpt_response(self, on_chunk) -> tuple[list, str]:
+        chunker = SentenceChunker(settings.GPT_STREAM_MIN_CHUNK_CHARS)
+        collector = ToolCallCollector()
+        stream = await self.open_ai_client.chat.completions.create(
+            **self._completion_options(), stream=True
+        )
+        async with stream:
+            async for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta
+                if delta.tool_calls:
+                    collector.feed(delta.tool_calls)
+                elif delta.content and not collector.calls:
+                    for chunk in chunker.feed(delta.content):
+                        await on_chunk(await self.translate(chunk))
+        return collector.tool_calls(), chunker.flush()
+
+    async def handle_update_user_preference(self, language: str):
+        """
+        Tool handler function to change language
+        """
+        if not language:
+            return None
+
+        selected_language = Languages(language)
+        if not await aset_user_language(self.user, selected_language):
+            return None
+
+        await self._update_session_history(
+            content="Updated user preference",
+            role=SessionRole.SYSTEM,
+        )
+        return f"Your preferred language is set to {selected_language.name.lower()}"
+
+    async def route_briefing(self, origin: str, destination: str) -> str:
+        fuel_stops = await self.find_fuel_stations(origin, destination, count=1)
+        route_message = self._format_route_message(
+            origin, destination, fuel_stops[0] if fuel_stops else None
+        )
+        instructions = self.delivery_instructions(origin, destination)
+        return f"{route_message}\n\n{instructions}"
+
+    async def handle_get_route(self, origin: str, destination: str):
+        """
+        Tool handler function to get route
+        """
+        ai_response = await aget_briefing(
+            self.user, "en", origin, destination
+        ) or await self.route_briefing(origin, destination)
+
+        await self._update_session_history(
+            content=ai_response,
+            role=SessionRole.SYSTEM,
+        )
+        return ai_response
+
+    async def handle_get_gas_stations(
+        self,
+        origin: str,
+        destination: str,
+        max_diesel_price: float = None,
+        count: int = None,
+    ):
+        gas_stations = self.prefetched_places.pop(
+            self._places_key(
+                "gas_station", origin, destination, max_diesel_price, count
+            ),
+            None,
+        )
+        if gas_stations is None:
+            gas_stations = await self.find_fuel_stations(
+                origin, destination, max_diesel_price, count
+            )
+        ai_response = self._format_stations("", gas_stations)
+
+        await self._update_session_history(
+            content="Gas stations identified and send to user",
+            role=SessionRole.SYSTEM,
+        )
+        return ai_response
+
+    async def handle_get_repair_stations(self, origin: str, destination: str):
+        ai_response = "Nearest repair stations: "
+
+        repair_stations = self.prefetched_places.pop(
+            self._places_key("car_repair", origin, destination), None
+        )
+        if repair_stations is None:
+            repair_stations = (
+                await self.search_places_along_route(
+                    ["car_repair"], origin, destination
+                )
+            )["car_repair"]
+        ai_response = self._format_stations(ai_response, repair_stations)
+
+        await self._update_session_history(
+            content="Repair stations identified and send to user",
+            role=SessionRole.SYSTEM,
+        )
+        return ai_response
+
+    async def handle_get_delivery_instructions(self, origin: str, destination: str):
+        ai_response = self.delivery_instructions(origin, destination)
+
+        await self._update_session_history(
+            content="Delivery instructions sent to user",
+            role=SessionRole.SYSTEM,
+        )
+        return ai_response
+
+    async def translate_segments(
+        self,
+        segments: list[str],
+        direction: Literal["IN"] | Literal["OUT"] = "OUT",
+    ) -> list[str]:
+        """
+        Translate reply segments to or from the language configured by the user
+        in a single request
+        """
+        language = await aget_user_language(self.user)
+
+        if language != "en":
+            source_lang, destination_lang = self._language_pair(language, direction)
+            segments = await self.translation_util._translate_batch(
+                segments, source_lang, destination_lang
+            )
+        return segments
+
+    async def translate(
+        self, message, direction: Literal["IN"] | Literal["OUT"] = "OUT"
+    ):
+        """
+        Translate to language configure by the user
+        """
+        return (await self.translate_segments([message], direction))[0]
+
+    async def append_service_option_message(self, message: str):
+        header, *options = await self.translate_segments(
+            self._service_option_segments()
+        )
+        return self._format_service_options(message, header, options)
+
+    async def build_reply(self, message: str) -> str:
+        message, header, *options = await self.translate_segments(
+            [message, *self._service_option_segments()]
+        )
+        return self._format_service_options(message, header, options)
+
+    async def _localized_briefing(self, origin: str, destination: str) -> str | None:
+        language = await aget_user_language(self.user)
+        briefing = await aget_briefing(self.user, language, origin, destination)
+        if briefing:
+            await self._update_session_history(
+                content=briefing, role=SessionRole.SYSTEM
+            )
+        return briefing
+
+    async def menu_response(self, key: str) -> str:
+        await self._update_session_history(
+            content=self.SERVICE_OPTION_MAP[key],
+            role=SessionRole.USER,
+        )
+        origin, destination = self.get_current_route()
+        if self.MENU_TOOL_MAP[key] == "get_route":
+            briefing = await self._localized_briefing(origin, destination)
+            if briefing:
+                return await self.append_service_option_message(briefing)
+
+        handler = getattr(self, f"handle_{self.MENU_TOOL_MAP[key]}")
+        return await self.build_reply(await handler(origin, destination))
+
+    async def ai_response(
+        self,
+        message: str = None,
+        media_url: str = None,
+        translated: bool = False,
+        on_chunk=None,
+    ):
+        """Generates a trucking response and suggests refueling stations if applicable."""
+
+        if not translated:
+            message = await self.translate(message, "IN")
+        # Handle language selection
+        await self._update_session_history(
+            content=message,
+            role=SessionRole.USER,
+        )
+
+        # Generate ai response
+        if on_chunk and not media_url and settings.GPT_STREAMING:
+            tool_calls, message = await self._stream_gpt_response(on_chunk)
+        else:
+            response = await self._get_gpt_response()
+            tool_calls = response.choices[0].message.tool_calls
+            message = response.choices[0].message.content
+
+        if tool_calls:
+            message = await self._process_tool_calls(tool_calls)
+            # Skip voice generation for tool output
+            return await self.build_reply(message), "text"
+
+        if media_url:
+            message = await self.translate(message)
+            return (
+                await self.translation_util._generate_audio(
+                    message, await aget_user_language(self.user)
+                ),
+                "audio",
+            )
+
+        return await self.build_reply(message), "text"
+
+    async def _search_nearby(
+        self, place_type: str, location, fetched: list = None
+    ) -> dict | None:
+        key, center = places_cache.cell(place_type, location, self.PLACES_RADIUS)
+
+        async def fetch():
+            headers, payload = self._places_request(place_type, center)
+            response = await self.http_client.post(
+                self.PLACES_URL, json=payload, headers=headers
+            )
+            data = response.json() if response.status_code == 200 else None
+            if fetched is not None:
+                fetched.append(data)
+            return data
+
+        return await places_cache.aget_or_fetch(key, fetch)
+
+    async def search_places_along_route(
+        self, place_types: list[str], origin: str, destination: str
+    ) -> dict[str, list[dict]]:
+        points = await route_planner.asample_points(origin, destination)
+        semaphore = asyncio.Semaphore(settings.PLACES_SEARCH_CONCURRENCY)
+
+        fetched = {place_type: [] for place_type in place_types}
+
+        async def search(place_type: str, point):
+            async with semaphore:
+                return await self._search_nearby(place_type, point, fetched[place_type])
+
+        searches = [
+            (place_type, point) for place_type in place_types for point in points
+        ]
+        results = await asyncio.gather(
+            *[search(place_type, point) for place_type, point in searches]
+        )
+
+        responses = {place_type: [] for place_type in place_types}
+        for (place_type, _), data in zip(searches, results):
+            responses[place_type].append(data)
+
+        for place_type in self.FUEL_PLACE_TYPES.intersection(fetched):
+            if fetched[place_type]:
+                await fuel_stations.arecord_places(fetched[place_type])
+        return {
+            place_type: self._merge_places(place_type, data, origin)
+            for place_type, data in responses.items()
+        }
+
+    async def find_fuel_stations(
+        self,
+        origin: str,
+        destination: str,
+        max_diesel_price: float = None,
+        count: int = None,
+    ) -> list[dict]:
+        count = count or self.PLACES_RESULT_LIMIT
+        points = await route_planner.asample_points(origin, destination)
+        stations = await fuel_stations.anearest(
+            points,
+            count,
+            max_diesel_price,
+            refresh=lambda: self.search_places_along_route(
+                ["gas_station"], origin, destination
+            ),
+        )
+        return [
+            self._catalogue_station(record, distance, origin)
+            for record, distance in stations
+        ]
+
+    async def find_gas_and_repair_stations(
+        self,
+        origin: str,
+        destination: str,
+        max_diesel_price: float = None,
+        count: int = None,
+    ) -> tuple[list[dict], list[dict]]:
+        count = count or self.PLACES_RESULT_LIMIT
+        points = await route_planner.asample_points(origin, destination)
+        found = {}
+
+        async def refresh():
+            found.update(
+                await self.search_places_along_route(
+                    ["gas_station", "car_repair"], origin, destination
+                )
+            )
+
+        stations = await fuel_stations.anearest(
+            points, count, max_diesel_price, refresh
+        )
+        if "car_repair" not in found:
+            found.update(
+                await self.search_places_along_route(
+                    ["car_repair"], origin, destination
+                )
+            )
+        return [
+            self._catalogue_station(record, distance, origin)
+            for record, distance in stations
+        ], found["car_repair"]
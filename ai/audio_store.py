@@ -0,0 +1,149 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from collections import Counter
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AudioStore:
+    """
+    Content-addressed store of synthesized speech under MEDIA_ROOT. Files are
+    named after the hash of (text, voice, model, language), so repeated
+    phrases are served from disk. The modification time doubles as last use
+    time and the least recently used files are removed above the size quota.
+    """
+
+    SUFFIX = ".mp3"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bytes = None
+        self.counters = Counter(hits=0, misses=0, evicted_files=0, evicted_bytes=0)
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(settings.MEDIA_ROOT, settings.TTS_STORE_DIR)
+
+    def _path(self, text: str, model: str, voice: str, language: str | None) -> str:
+        key = "\0".join([text, voice, model, language or ""])
+        file_name = hashlib.sha256(key.encode("utf-8")).hexdigest() + self.SUFFIX
+        return os.path.join(self.directory, file_name)
+
+    def _files(self) -> list[os.DirEntry]:
+        try:
+            with os.scandir(self.directory) as entries:
+                return [
+                    entry
+                    for entry in entries
+                    if entry.is_file() and entry.name.endswith(self.SUFFIX)
+                ]
+        except FileNotFoundError:
+            return []
+
+    def disk_usage(self) -> int:
+        if self._bytes is None:
+            with self._lock:
+                if self._bytes is None:
+                    self._bytes = sum(entry.stat().st_size for entry in self._files())
+        return self._bytes
+
+    def lookup(
+        self, text: str, model: str, voice: str, language: str = None
+    ) -> str | None:
+        """
+        Path of the stored audio for the text, touched as recently used
+        """
+        path = self._path(text, model, voice, language)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            self.counters["misses"] += 1
+            return None
+        self.counters["hits"] += 1
+        return path
+
+    def temp_path(self) -> str:
+        """
+        Scratch file to stream new audio into before `commit`
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, f".{uuid.uuid4().hex}.tmp")
+
+    def discard(self, temp_path: str):
+        """
+        Remove a scratch file that will not be committed, e.g. after a failed
+        download, scratch files are never collected otherwise
+        """
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def commit(
+        self, temp_path: str, text: str, model: str, voice: str, language: str = None
+    ) -> str:
+        """
+        Move a finished file into the store and collect garbage over the quota
+        """
+        path = self._path(text, model, voice, language)
+        size = os.path.getsize(temp_path)
+        # Measure before the replace so the new file is not counted twice
+        self.disk_usage()
+
+        with self._lock:
+            try:
+                replaced = os.path.getsize(path)
+            except FileNotFoundError:
+                replaced = 0
+            os.replace(temp_path, path)
+            self._bytes += size - replaced
+        if self._bytes > settings.TTS_STORE_MAX_BYTES:
+            self.collect_garbage()
+        return path
+
+    def collect_garbage(self) -> int:
+        """
+        Remove least recently used files until the store is below the low
+        watermark of its quota, returns the number of removed files
+        """
+        with self._lock:
+            entries = sorted(self._files(), key=lambda entry: entry.stat().st_mtime)
+            usage = sum(entry.stat().st_size for entry in entries)
+            target = settings.TTS_STORE_MAX_BYTES * settings.TTS_STORE_LOW_WATERMARK
+
+            removed = 0
+            for entry in entries:
+                if usage <= target:
+                    break
+                size = entry.stat().st_size
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    continue
+                except OSError:
+                    logger.exception("Could not remove %s", entry.path)
+                    continue
+                usage -= size
+                removed += 1
+                self.counters["evicted_files"] += 1
+                self.counters["evicted_bytes"] += size
+
+            self._bytes = usage
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "bytes_on_disk": self.disk_usage(),
+            "max_bytes": settings.TTS_STORE_MAX_BYTES,
+            "hit_rate": self.counters["hits"] / lookups if lookups else None,
+        }
+
+
+audio_store = AudioStore()
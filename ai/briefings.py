@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from ai.models import OpenAiConvSession, RouteBriefing, UserPreference
+
+UPSERT_OPTIONS = {
+    "update_conflicts": True,
+    "unique_fields": ["user", "route_date", "language"],
+    "update_fields": ["origin", "destination", "message", "updated_date"],
+}
+
+
+def _briefing_query(user: str, language: str, origin: str, destination: str):
+    return RouteBriefing.objects.filter(
+        user=user,
+        route_date=timezone.localdate(),
+        language=language,
+        origin=origin,
+        destination=destination,
+    ).values_list("message", flat=True)
+
+
+def get_briefing(user: str, language: str, origin: str, destination: str) -> str | None:
+    """
+    Today's precomputed briefing of the driver for the route, if any
+    """
+    return _briefing_query(user, language, origin, destination).first()
+
+
+async def aget_briefing(
+    user: str, language: str, origin: str, destination: str
+) -> str | None:
+    return await _briefing_query(user, language, origin, destination).afirst()
+
+
+def active_drivers(active_days: int) -> list[str]:
+    """
+    Users with a stored preference or a conversation in the last days
+    """
+    since = timezone.now() - timedelta(days=active_days)
+    users = set(UserPreference.objects.values_list("user", flat=True))
+    users.update(
+        OpenAiConvSession.objects.filter(created_date__gte=since)
+        .values_list("user", flat=True)
+        .distinct()
+    )
+    return sorted(users)
+
+
+def save_briefings(briefings: list[RouteBriefing]) -> int:
+    """
+    Upsert the briefings and drop the ones of past days. Today's briefings
+    are kept even when precomputing a later day, drivers still use them.
+    """
+    RouteBriefing.objects.bulk_create(briefings, batch_size=1000, **UPSERT_OPTIONS)
+    deleted, _ = RouteBriefing.objects.filter(
+        route_date__lt=timezone.localdate()
+    ).delete()
+    return deleted
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import threading
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from geopy.adapters import AioHTTPAdapter
+from geopy.geocoders import Nominatim
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud.translate_v2 import Client as TranslateClient
+from google.maps import routing_v2
+from google.oauth2 import service_account
+from openai import AsyncOpenAI, OpenAI
+from requests.adapters import HTTPAdapter
+from twilio.http.async_http_client import AsyncTwilioHttpClient
+from twilio.http.http_client import TwilioHttpClient
+from twilio.rest import Client as TwilioClient
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of long-lived SDK and HTTP clients.
+
+    Clients are created once on first use and shared by every request so their
+    keep-alive connection pools are reused. Async clients are bound to the
+    event loop they were created on and are kept per loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _get(self, name: str, factory):
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = factory()
+                    self._clients[name] = client
+        return client
+
+    def _get_async(self, name: str, factory):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            loop_clients = self._async_clients.setdefault(loop, {})
+            if name not in loop_clients:
+                loop_clients[name] = factory()
+            return loop_clients[name]
+
+    def _requests_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=settings.HTTP_POOL_SIZE,
+            pool_maxsize=settings.HTTP_POOL_SIZE,
+            max_retries=settings.HTTP_MAX_RETRIES,
+        )
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _httpx_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=settings.HTTP_POOL_SIZE,
+            max_keepalive_connections=settings.HTTP_POOL_SIZE,
+        )
+
+    def http(self) -> requests.Session:
+        """
+        Shared requests session for plain HTTP APIs (Places, Twilio media)
+        """
+        return self._get("http", self._requests_session)
+
+    def openai(self) -> OpenAI:
+        return self._get(
+            "openai",
+            lambda: OpenAI(
+                api_key=settings.OPEN_AI_KEY,
+                timeout=settings.HTTP_TIMEOUT,
+                max_retries=settings.HTTP_MAX_RETRIES,
+                http_client=httpx.Client(
+                    limits=self._httpx_limits(), timeout=settings.HTTP_TIMEOUT
+                ),
+            ),
+        )
+
+    def google_credentials(self) -> service_account.Credentials:
+        return self._get(
+            "google_credentials",
+            lambda: service_account.Credentials.from_service_account_info(
+                settings.GOOGLE_SERVICE_JSON, scopes=TranslateClient.SCOPE
+            ),
+        )
+
+    def translate(self) -> TranslateClient:
+        def factory():
+            credentials = self.google_credentials()
+            session = AuthorizedSession(credentials)
+            adapter = HTTPAdapter(
+                pool_connections=settings.HTTP_POOL_SIZE,
+                pool_maxsize=settings.HTTP_POOL_SIZE,
+            )
+            session.mount("https://", adapter)
+            return TranslateClient(credentials=credentials, _http=session)
+
+        return self._get("translate", factory)
+
+    def twilio(self) -> TwilioClient:
+        def factory():
+            http_client = TwilioHttpClient(
+                timeout=settings.HTTP_TIMEOUT, max_retries=settings.HTTP_MAX_RETRIES
+            )
+            http_client.session.mount(
+                "https://",
+                HTTPAdapter(
+                    pool_connections=settings.HTTP_POOL_SIZE,
+                    pool_maxsize=settings.HTTP_POOL_SIZE,
+                    max_retries=settings.HTTP_MAX_RETRIES,
+                ),
+            )
+            return TwilioClient(
+                settings.TWILIO_ACCOUNT_SID,
+                settings.TWILIO_AUTH_TOKEN,
+                http_client=http_client,
+            )
+
+        return self._get("twilio", factory)
+
+    def geocoder(self) -> Nominatim:
+        return self._get(
+            "geocoder",
+            lambda: Nominatim(
+                user_agent="geocoding_app", timeout=settings.HTTP_TIMEOUT
+            ),
+        )
+
+    def routes(self) -> routing_v2.RoutesClient:
+        return self._get(
+            "routes",
+            lambda: routing_v2.RoutesClient(
+                client_options={"api_key": settings.GOOGLE_MAPS_API_KEY}
+            ),
+        )
+
+    def async_http(self) -> httpx.AsyncClient:
+        return self._get_async(
+            "http",
+            lambda: httpx.AsyncClient(
+                limits=self._httpx_limits(), timeout=settings.HTTP_TIMEOUT
+            ),
+        )
+
+    def async_geocoder(self) -> Nominatim:
+        return self._get_async(
+            "geocoder",
+            lambda: Nominatim(
+                user_agent="geocoding_app",
+                timeout=settings.HTTP_TIMEOUT,
+                adapter_factory=AioHTTPAdapter,
+            ),
+        )
+
+    def async_openai(self) -> AsyncOpenAI:
+        return self._get_async(
+            "openai",
+            lambda: AsyncOpenAI(
+                api_key=settings.OPEN_AI_KEY,
+                timeout=settings.HTTP_TIMEOUT,
+                max_retries=settings.HTTP_MAX_RETRIES,
+                http_client=httpx.AsyncClient(
+                    limits=self._httpx_limits(), timeout=settings.HTTP_TIMEOUT
+                ),
+            ),
+        )
+
+    def async_routes(self) -> routing_v2.RoutesAsyncClient:
+        return self._get_async(
+            "routes",
+            lambda: routing_v2.RoutesAsyncClient(
+                client_options={"api_key": settings.GOOGLE_MAPS_API_KEY}
+            ),
+        )
+
+    def async_twilio(self) -> TwilioClient:
+        return self._get_async(
+            "twilio",
+            lambda: TwilioClient(
+                settings.TWILIO_ACCOUNT_SID,
+                settings.TWILIO_AUTH_TOKEN,
+                http_client=AsyncTwilioHttpClient(
+                    timeout=settings.HTTP_TIMEOUT,
+                    max_retries=settings.HTTP_MAX_RETRIES,
+                ),
+            ),
+        )
+
+    def warm(self):
+        """
+        Create the sync clients up front so the first webhook does not pay for it
+        """
+        for name in ["http", "openai", "translate", "twilio", "geocoder"]:
+            try:
+                getattr(self, name)()
+            except Exception as e:
+                logger.warning("Could not warm %s client: %s", name, e)
+
+
+clients = ClientRegistry()
@@ -48,7 +48,7 @@ TOOLS = [
         "type": "function",
         "function": {
             "name": "get_gas_stations",
-            "description": "Get fuel stations nearby",
+            "description": "Get fuel stations along the route, optionally only those with diesel under a price",
             "parameters": {
                 "type": "object",
                 "properties": {
@@ -60,10 +60,20 @@ TOOLS = [
                         "type": "string",
                         "description": "Ending point/destination of the journey",
                     },
+                    "max_diesel_price": {
+                        "type": ["number", "null"],
+                        "description": "Highest acceptable diesel price in euro per litre",
+                    },
+                    "count": {
+                        "type": ["integer", "null"],
+                        "description": "Number of stations to return",
+                    },
                 },
                 "required": [
                     "origin",
                     "destination",
+                    "max_diesel_price",
+                    "count",
                 ],
                 "additionalProperties": False,
             },
@@ -96,6 +106,32 @@ TOOLS = [
             "strict": True,
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_delivery_instructions",
+            "description": "Get delivery instructions (documents, tolls, driving rules) for a delivery",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "origin": {
+                        "type": "string",
+                        "description": "Starting point of the journey",
+                    },
+                    "destination": {
+                        "type": "string",
+                        "description": "Ending point/destination of the journey",
+                    },
+                },
+                "required": [
+                    "origin",
+                    "destination",
+                ],
+                "additionalProperties": False,
+            },
+            "strict": True,
+        },
+    },
 ]
 
 AI_PROMPT = """
@@ -108,5 +144,37 @@ AI_PROMPT = """
         - Todays route is from Berlin-to-Vienna
         - Do not add any special characters in the response.
         - Always use tools to get route, fuel stations and repair station information.
-        - Generate a random meaningful delivery instruction for Berlin-to-Vienna shipment, Eg: documents to carry, toll related information, rule and regulations.
+        - Always use the delivery instructions tool for delivery instructions, do not make them up.
+        """
+
+SUMMARY_PROMPT = """
+        - You summarise a conversation between a truck driver and a dispatcher.
+        - Merge the new messages into the current summary.
+        - Keep facts needed later: locations, routes, vehicle issues, requests and answers given.
+        - Keep the summary under 150 words.
         """
+
+QUICK_HELP_MESSAGE = "For quick help, select any of the option"
+
+# Route assigned to drivers for the current shift
+TODAYS_ROUTE = ("Berlin", "Vienna")
+
+DELIVERY_INSTRUCTIONS = """Delivery instructions: {origin} to {destination}
+
+Documents to carry: CMR consignment note, delivery note, driver licence, driver card for the tachograph and vehicle registration.
+
+Tolls: truck toll in Germany is charged per km through Toll Collect, in Austria the GO-Box must be registered and topped up before crossing the border.
+
+Rules: respect the weekend and holiday truck driving bans in Germany and Austria, take a 45 minute break after 4.5 hours of driving and do not exceed 9 hours of driving per day.
+
+Call dispatch before unloading at the destination."""
+
+# Instructions for any other route, the tolls and driving bans above only hold
+# for TODAYS_ROUTE
+GENERAL_DELIVERY_INSTRUCTIONS = """Delivery instructions: {origin} to {destination}
+
+Documents to carry: CMR consignment note, delivery note, driver licence, driver card for the tachograph and vehicle registration.
+
+Tolls and rules: check the truck toll system and the weekend and holiday driving bans of every country on the route before departure, take a 45 minute break after 4.5 hours of driving and do not exceed 9 hours of driving per day.
+
+Call dispatch before unloading at the destination."""
@@ -0,0 +1,157 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+from ai.clients import clients
+from ai.constants import AI_PROMPT, SUMMARY_PROMPT
+from ai.models import ConversationSummary, OpenAiConvSession, SessionRole
+
+logger = logging.getLogger(__name__)
+
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.CONTEXT_SUMMARY_WORKERS, thread_name_prefix="summary"
+)
+_refresh_lock = threading.Lock()
+_refreshing: set[str] = set()
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Rough token count, ~4 characters per token plus per-message overhead
+    """
+    return len(text) // 4 + 4
+
+
+class ConversationContext:
+    """
+    Builds a bounded context for the LLM: the system prompt, a rolling summary
+    of older turns and the newest turns that fit in the turn and token budget.
+    Only a LIMITed slice of the history is read, so the context size stays
+    constant however long the driver has used the bot.
+    """
+
+    def __init__(self, user: str, max_turns: int = None, token_budget: int = None):
+        self.user = user
+        self.max_turns = max_turns or settings.CONTEXT_MAX_TURNS
+        self.token_budget = token_budget or settings.CONTEXT_TOKEN_BUDGET
+        self.oldest_window_id = None
+
+    def _recent_sessions(self):
+        return (
+            OpenAiConvSession.objects.filter(user=self.user)
+            .order_by("-created_date", "-id")
+            .values("id", "role", "message")[: self.max_turns]
+        )
+
+    def _summary(self):
+        return (
+            ConversationSummary.objects.filter(user=self.user)
+            .values("summary", "last_session_id")
+            .first()
+        )
+
+    def _build(self, sessions: list[dict], summary: dict | None) -> list[dict]:
+        messages = [{"role": SessionRole.SYSTEM.value, "content": AI_PROMPT}]
+        budget = self.token_budget - estimate_tokens(AI_PROMPT)
+
+        if summary and summary["summary"]:
+            content = f"Summary of the earlier conversation: {summary['summary']}"
+            messages.append({"role": SessionRole.SYSTEM.value, "content": content})
+            budget -= estimate_tokens(content)
+
+        # Sessions are newest first, keep as many as fit in the budget
+        window = []
+        for session in sessions:
+            budget -= estimate_tokens(session["message"])
+            if budget < 0 and window:
+                break
+            window.append(session)
+
+        self.oldest_window_id = window[-1]["id"] if window else None
+        for session in reversed(window):
+            messages.append({"role": session["role"], "content": session["message"]})
+        return messages
+
+    def load(self) -> list[dict]:
+        return self._build(list(self._recent_sessions()), self._summary())
+
+    async def aload(self) -> list[dict]:
+        sessions = [session async for session in self._recent_sessions()]
+        summary = await (
+            ConversationSummary.objects.filter(user=self.user)
+            .values("summary", "last_session_id")
+            .afirst()
+        )
+        return self._build(sessions, summary)
+
+    def schedule_refresh(self):
+        """
+        Refresh the summary on a background thread, off the turn and the
+        webhook request. A driver has at most one refresh queued at a time.
+        """
+        if self.oldest_window_id is None:
+            return
+        with _refresh_lock:
+            if self.user in _refreshing:
+                return
+            _refreshing.add(self.user)
+        _refresh_executor.submit(self._run_refresh)
+
+    def _run_refresh(self):
+        try:
+            self.refresh_summary()
+        except Exception:
+            logger.exception("Failed to refresh conversation summary")
+        finally:
+            with _refresh_lock:
+                _refreshing.discard(self.user)
+            # Pool threads open their own DB connections
+            connections.close_all()
+
+    def refresh_summary(self):
+        """
+        Fold every turn that fell out of the window into the rolling summary,
+        so no turn is missing from both the summary and the window
+        """
+        if self.oldest_window_id is None:
+            return
+
+        summary, _ = ConversationSummary.objects.get_or_create(user=self.user)
+        pending = list(
+            OpenAiConvSession.objects.filter(
+                user=self.user,
+                id__gt=summary.last_session_id,
+                id__lt=self.oldest_window_id,
+            )
+            .order_by("id")
+            .values("id", "role", "message")[: settings.CONTEXT_SUMMARY_MAX_ROWS]
+        )
+        if not pending:
+            return
+
+        transcript = "\n".join(
+            f"{session['role']}: {session['message']}" for session in pending
+        )
+        try:
+            response = clients.openai().chat.completions.create(
+                model=settings.CONTEXT_SUMMARY_MODEL,
+                messages=[
+                    {"role": SessionRole.SYSTEM.value, "content": SUMMARY_PROMPT},
+                    {
+                        "role": SessionRole.USER.value,
+                        "content": f"Current summary: {summary.summary or 'None'}"
+                        f"\n\nNew messages:\n{transcript}",
+                    },
+                ],
+                max_tokens=300,
+            )
+        except Exception:
+            logger.exception("Failed to refresh conversation summary")
+            return
+
+        summary.summary = response.choices[0].message.content
+        summary.last_session_id = pending[-1]["id"]
+        summary.save(update_fields=["summary", "last_session_id", "updated_date"])
@@ -0,0 +1,331 @@
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from ai.models import FuelStation
+from ai.routing import EARTH_RADIUS_KM, haversine_km
+
+FuelStationRecord = namedtuple(
+    "FuelStationRecord",
+    ["place_id", "name", "brand", "address", "diesel_price", "price_updated_date"],
+)
+
+# Stations near the route and whether the catalogue needs fresh Places data
+# there, because prices went stale or no station is known at all
+FuelLookup = namedtuple("FuelLookup", ["stations", "stale"])
+
+UPSERT_OPTIONS = {
+    "update_conflicts": True,
+    "unique_fields": ["place_id"],
+    "update_fields": [
+        "name",
+        "brand",
+        "address",
+        "latitude",
+        "longitude",
+        "diesel_price",
+        "price_updated_date",
+        "updated_date",
+    ],
+}
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def money_amount(price: dict) -> Decimal:
+    """
+    Amount of a google.type.Money dict (units and nanos)
+    """
+    return Decimal(price.get("units", "0")) + Decimal(price.get("nanos", 0)) / 10**9
+
+
+def diesel_price(place: dict) -> Decimal | None:
+    """
+    Cheapest diesel price of a Places result
+    """
+    prices = [
+        money_amount(item["price"])
+        for item in (place.get("fuelOptions") or {}).get("fuelPrices", [])
+        if "DIESEL" in item["type"] and "price" in item
+    ]
+    return min(prices) if prices else None
+
+
+def stations_from_places(responses: list[dict | None]) -> list[FuelStation]:
+    """
+    Catalogue rows for the priced fuel stations of Places nearby responses.
+    Prices are dated when we saw them, Google's updateTime can be days old
+    while still being the current price.
+    """
+    observed = timezone.now()
+    stations = {}
+    for data in responses:
+        for place in (data or {}).get("places", []):
+            price = diesel_price(place)
+            if price is None or "location" not in place:
+                continue
+            stations[place["id"]] = FuelStation(
+                place_id=place["id"],
+                name=place["displayName"]["text"],
+                brand=place["displayName"]["text"][:100],
+                address=place.get("formattedAddress", ""),
+                latitude=place["location"]["latitude"],
+                longitude=place["location"]["longitude"],
+                diesel_price=price,
+                price_updated_date=observed,
+            )
+    return list(stations.values())
+
+
+class FuelStationIndex:
+    """
+    In-memory grid index over the FuelStation catalogue. Stations are bucketed
+    in cells of FUEL_STATION_GRID_DEGREES so a query only measures the
+    stations in the cells around the route points.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self.counters = Counter(queries=0, served=0, api_fallbacks=0)
+
+    def _cell(self, latitude: float, longitude: float) -> tuple[int, int]:
+        size = settings.FUEL_STATION_GRID_DEGREES
+        return math.floor(latitude / size), math.floor(longitude / size)
+
+    def _build(self) -> dict:
+        rows = list(
+            FuelStation.objects.exclude(diesel_price=None).values_list(
+                "place_id",
+                "name",
+                "brand",
+                "address",
+                "latitude",
+                "longitude",
+                "diesel_price",
+                "price_updated_date",
+            )
+        )
+        return self._snapshot_of(rows)
+
+    def _snapshot_of(self, rows: list[tuple]) -> dict:
+        cells = {}
+        for index, row in enumerate(rows):
+            cells.setdefault(self._cell(row[4], row[5]), []).append(index)
+
+        return {
+            "rows": rows,
+            "positions": {row[0]: index for index, row in enumerate(rows)},
+            "records": [FuelStationRecord(*row[:4], row[6], row[7]) for row in rows],
+            "latitudes": np.radians(np.array([row[4] for row in rows], dtype=float)),
+            "longitudes": np.radians(np.array([row[5] for row in rows], dtype=float)),
+            "prices": np.array([float(row[6]) for row in rows], dtype=float),
+            "reported": np.array(
+                [row[7].timestamp() if row[7] else 0.0 for row in rows], dtype=float
+            ),
+            "cells": {
+                cell: np.array(indices, dtype=np.int64)
+                for cell, indices in cells.items()
+            },
+        }
+
+    def _merge(self, stations: list[FuelStation]):
+        """
+        Apply saved stations to the loaded snapshot, known stations are updated
+        in place and new ones appended, without reading the catalogue again
+        """
+        stations = [station for station in stations if station.diesel_price is not None]
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or not stations:
+                return
+
+            rows = list(snapshot["rows"])
+            positions = snapshot["positions"]
+            rebuild = False
+            for station in stations:
+                row = (
+                    station.place_id,
+                    station.name,
+                    station.brand,
+                    station.address,
+                    station.latitude,
+                    station.longitude,
+                    station.diesel_price,
+                    station.price_updated_date,
+                )
+                index = positions.get(station.place_id)
+                moved = index is not None and (
+                    self._cell(*rows[index][4:6]) != self._cell(*row[4:6])
+                )
+                rebuild = rebuild or index is None or moved
+                if index is None:
+                    positions[station.place_id] = len(rows)
+                    rows.append(row)
+                else:
+                    rows[index] = row
+
+            if rebuild:
+                # New cells or cell members, the arrays are rebuilt in memory
+                self._snapshot = self._snapshot_of(rows)
+                return
+
+            # Same stations in the same cells, swap the changed values in
+            for station in stations:
+                index = positions[station.place_id]
+                snapshot["records"][index] = FuelStationRecord(
+                    *rows[index][:4], rows[index][6], rows[index][7]
+                )
+                snapshot["latitudes"][index] = math.radians(station.latitude)
+                snapshot["longitudes"][index] = math.radians(station.longitude)
+                snapshot["prices"][index] = float(station.diesel_price)
+                snapshot["reported"][index] = (
+                    station.price_updated_date.timestamp()
+                    if station.price_updated_date
+                    else 0.0
+                )
+            snapshot["rows"] = rows
+
+    def _current(self) -> dict:
+        expired = time.monotonic() - self._loaded_at > settings.FUEL_STATION_INDEX_TTL
+        if expired or self._snapshot is None:
+            with self._lock:
+                if expired or self._snapshot is None:
+                    self._snapshot = self._build()
+                    self._loaded_at = time.monotonic()
+        return self._snapshot
+
+    def _candidates(self, snapshot: dict, points) -> np.ndarray:
+        max_distance = settings.FUEL_STATION_MAX_DISTANCE_KM
+        size = settings.FUEL_STATION_GRID_DEGREES
+        rows = math.ceil(max_distance / (KM_PER_DEGREE * size))
+
+        found = []
+        for point in points:
+            lat_cell, lon_cell = self._cell(point.latitude, point.longitude)
+            scale = max(math.cos(math.radians(point.latitude)), 0.01)
+            columns = math.ceil(rows / scale)
+            for i in range(lat_cell - rows, lat_cell + rows + 1):
+                for j in range(lon_cell - columns, lon_cell + columns + 1):
+                    indices = snapshot["cells"].get((i, j))
+                    if indices is not None:
+                        found.append(indices)
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+    def _query(
+        self, snapshot: dict, points, count: int, max_price: float | None
+    ) -> FuelLookup:
+        self.counters["queries"] += 1
+        candidates = self._candidates(snapshot, points)
+        if not len(candidates):
+            return FuelLookup([], True)
+
+        route = np.radians(np.array(points, dtype=float))
+        distances = haversine_km(
+            route[:, :1],
+            route[:, 1:],
+            snapshot["latitudes"][candidates],
+            snapshot["longitudes"][candidates],
+        ).min(axis=0)
+        nearby = distances <= settings.FUEL_STATION_MAX_DISTANCE_KM
+        candidates, distances = candidates[nearby], distances[nearby]
+        if not len(candidates):
+            return FuelLookup([], True)
+
+        cutoff = timezone.now() - timedelta(hours=settings.FUEL_PRICE_MAX_AGE_HOURS)
+        fresh = snapshot["reported"][candidates] >= cutoff.timestamp()
+        keep = fresh.copy()
+        if max_price is not None:
+            keep &= snapshot["prices"][candidates] <= max_price
+        candidates, distances = candidates[keep], distances[keep]
+
+        order = np.argsort(distances)[:count]
+        stations = [
+            (snapshot["records"][candidates[i]], float(distances[i])) for i in order
+        ]
+        # Fewer than `count` matches is an answer, not a reason to search
+        # again, as long as the prices near the route are fresh
+        stale = len(stations) < count and not fresh.all()
+        if not stale:
+            self.counters["served"] += 1
+        return FuelLookup(stations, stale)
+
+    def _lookup(self, points, count: int, max_price: float | None) -> FuelLookup:
+        if not points:
+            return FuelLookup([], False)
+        return self._query(self._current(), points, count, max_price)
+
+    async def _alookup(self, points, count: int, max_price: float | None) -> FuelLookup:
+        if not points:
+            return FuelLookup([], False)
+        snapshot = await sync_to_async(self._current)()
+        return self._query(snapshot, points, count, max_price)
+
+    def nearest(
+        self, points, count: int, max_price: float | None = None, refresh=None
+    ) -> list[tuple[FuelStationRecord, float]]:
+        """
+        Up to `count` stations with a fresh diesel price (below `max_price`)
+        closest to any of the points, with their distance in km. When the
+        prices near the route are stale `refresh` is called to record fresh
+        Places data and the catalogue is asked again.
+        """
+        found = self._lookup(points, count, max_price)
+        if found.stale and refresh is not None:
+            self.counters["api_fallbacks"] += 1
+            refresh()
+            found = self._lookup(points, count, max_price)
+        return found.stations
+
+    async def anearest(
+        self, points, count: int, max_price: float | None = None, refresh=None
+    ) -> list[tuple[FuelStationRecord, float]]:
+        found = await self._alookup(points, count, max_price)
+        if found.stale and refresh is not None:
+            self.counters["api_fallbacks"] += 1
+            await refresh()
+            found = await self._alookup(points, count, max_price)
+        return found.stations
+
+    def save(self, stations: list[FuelStation], batch_size: int = 1000):
+        FuelStation.objects.bulk_create(
+            stations, batch_size=batch_size, **UPSERT_OPTIONS
+        )
+        self._merge(stations)
+
+    def record_places(self, responses: list[dict | None]):
+        """
+        Store the diesel prices seen in freshly fetched Places nearby responses
+        """
+        stations = stations_from_places(responses)
+        if stations:
+            self.save(stations)
+
+    async def arecord_places(self, responses: list[dict | None]):
+        stations = stations_from_places(responses)
+        if stations:
+            await FuelStation.objects.abulk_create(stations, **UPSERT_OPTIONS)
+            self._merge(stations)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "size": len(self._snapshot["records"]) if self._snapshot else 0,
+            "age_seconds": (
+                time.monotonic() - self._loaded_at if self._snapshot else None
+            ),
+        }
+
+
+fuel_stations = FuelStationIndex()
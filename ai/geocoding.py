@@ -0,0 +1,239 @@
+import bisect
+import csv
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+import numpy as np
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils import timezone
+from geopy.extra.rate_limiter import AsyncRateLimiter, RateLimiter
+
+from ai.clients import clients
+from ai.models import GeocodeCacheEntry
+
+logger = logging.getLogger(__name__)
+
+GeoPoint = namedtuple("GeoPoint", ["latitude", "longitude"])
+
+
+def normalize_place_name(name: str) -> str:
+    """
+    Case, accent-width and punctuation insensitive key for a place name
+    """
+    name = unicodedata.normalize("NFKC", name).casefold()
+    name = re.sub(r"[^\w\s]", " ", name)
+    return " ".join(name.split())
+
+
+class Gazetteer:
+    """
+    Offline place index loaded from a CSV file (name, latitude, longitude).
+    Names are kept sorted next to float32 coordinate arrays, lookups are a
+    binary search.
+    """
+
+    def __init__(self, path: str):
+        rows = {}
+        with open(path, newline="", encoding="utf-8") as places_file:
+            for row in csv.DictReader(places_file):
+                rows[normalize_place_name(row["name"])] = (
+                    float(row["latitude"]),
+                    float(row["longitude"]),
+                )
+
+        self.names = sorted(rows)
+        coordinates = np.array([rows[name] for name in self.names], dtype=np.float32)
+        self.latitudes = coordinates[:, 0] if len(coordinates) else coordinates
+        self.longitudes = coordinates[:, 1] if len(coordinates) else coordinates
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, query: str) -> GeoPoint | None:
+        index = bisect.bisect_left(self.names, query)
+        if index < len(self.names) and self.names[index] == query:
+            return GeoPoint(float(self.latitudes[index]), float(self.longitudes[index]))
+        return None
+
+
+class Geocoder:
+    """
+    Layered geocoder: in-memory cache, optional offline gazetteer, DB cache
+    and the rate-limited Nominatim geocoder as the last resort
+    """
+
+    TIERS = ["memory", "db", "gazetteer", "remote"]
+
+    def __init__(self):
+        self._cache = TTLCache(
+            maxsize=settings.GEOCODING_MEMORY_CACHE_SIZE,
+            ttl=settings.GEOCODING_MEMORY_CACHE_TTL,
+        )
+        self._lock = threading.Lock()
+        self._gazetteer = None
+        self._gazetteer_loaded = False
+        self._remote = None
+        self._async_remote = None
+        self.counters = Counter()
+        self.latency = Counter()
+
+    @property
+    def gazetteer(self) -> Gazetteer | None:
+        if not self._gazetteer_loaded:
+            with self._lock:
+                if not self._gazetteer_loaded and settings.GEOCODING_GAZETTEER_PATH:
+                    try:
+                        self._gazetteer = Gazetteer(settings.GEOCODING_GAZETTEER_PATH)
+                    except (OSError, KeyError, ValueError):
+                        logger.exception("Could not load the gazetteer")
+                self._gazetteer_loaded = True
+        return self._gazetteer
+
+    def _record(self, tier: str, started: float):
+        self.counters[tier] += 1
+        self.latency[tier] += time.perf_counter() - started
+
+    def _remember(self, query: str, point: GeoPoint):
+        with self._lock:
+            self._cache[query] = point
+
+    def _db_cutoff(self):
+        return timezone.now() - timedelta(days=settings.GEOCODING_DB_CACHE_TTL_DAYS)
+
+    def _db_query(self, query: str):
+        return GeocodeCacheEntry.objects.filter(
+            query=query, updated_date__gte=self._db_cutoff()
+        ).values_list("latitude", "longitude")
+
+    def _upsert_options(self) -> dict:
+        return {
+            "update_conflicts": True,
+            "unique_fields": ["query"],
+            "update_fields": ["latitude", "longitude", "updated_date"],
+        }
+
+    def _remote_geocoder(self) -> RateLimiter:
+        # Nominatim's usage policy allows about one request per second
+        with self._lock:
+            if self._remote is None:
+                self._remote = RateLimiter(
+                    clients.geocoder().geocode,
+                    min_delay_seconds=settings.GEOCODING_MIN_DELAY_SECONDS,
+                )
+            return self._remote
+
+    def _async_remote_geocoder(self) -> AsyncRateLimiter:
+        geolocator = clients.async_geocoder()
+        with self._lock:
+            if self._async_remote is None or self._async_remote[0] is not geolocator:
+                self._async_remote = (
+                    geolocator,
+                    AsyncRateLimiter(
+                        geolocator.geocode,
+                        min_delay_seconds=settings.GEOCODING_MIN_DELAY_SECONDS,
+                    ),
+                )
+            return self._async_remote[1]
+
+    def _local(self, query: str) -> GeoPoint | None:
+        started = time.perf_counter()
+        with self._lock:
+            point = self._cache.get(query)
+        if point:
+            self._record("memory", started)
+            return point
+
+        if self.gazetteer:
+            point = self.gazetteer.lookup(query)
+            if point:
+                self._remember(query, point)
+                self._record("gazetteer", started)
+                return point
+        return None
+
+    def geocode(self, name: str) -> GeoPoint | None:
+        query = normalize_place_name(name)
+        point = self._local(query)
+        if point:
+            return point
+
+        started = time.perf_counter()
+        row = self._db_query(query).first()
+        if row:
+            point = GeoPoint(*row)
+            self._remember(query, point)
+            self._record("db", started)
+            return point
+
+        location = self._remote_geocoder()(name)
+        self._record("remote", started)
+        if not location:
+            self.counters["not_found"] += 1
+            return None
+
+        point = GeoPoint(location.latitude, location.longitude)
+        self._remember(query, point)
+        GeocodeCacheEntry.objects.bulk_create(
+            [GeocodeCacheEntry(query=query, latitude=point[0], longitude=point[1])],
+            **self._upsert_options(),
+        )
+        return point
+
+    async def ageocode(self, name: str) -> GeoPoint | None:
+        query = normalize_place_name(name)
+        point = self._local(query)
+        if point:
+            return point
+
+        started = time.perf_counter()
+        row = await self._db_query(query).afirst()
+        if row:
+            point = GeoPoint(*row)
+            self._remember(query, point)
+            self._record("db", started)
+            return point
+
+        location = await self._async_remote_geocoder()(name)
+        self._record("remote", started)
+        if not location:
+            self.counters["not_found"] += 1
+            return None
+
+        point = GeoPoint(location.latitude, location.longitude)
+        self._remember(query, point)
+        await GeocodeCacheEntry.objects.abulk_create(
+            [GeocodeCacheEntry(query=query, latitude=point[0], longitude=point[1])],
+            **self._upsert_options(),
+        )
+        return point
+
+    def stats(self) -> dict:
+        lookups = sum(self.counters[tier] for tier in self.TIERS)
+        return {
+            "lookups": lookups,
+            "not_found": self.counters["not_found"],
+            "hit_rate": (
+                (lookups - self.counters["remote"]) / lookups if lookups else None
+            ),
+            "gazetteer_size": len(self._gazetteer) if self._gazetteer else 0,
+            "tiers": {
+                tier: {
+                    "count": self.counters[tier],
+                    "avg_latency_ms": (
+                        self.latency[tier] / self.counters[tier] * 1000
+                        if self.counters[tier]
+                        else None
+                    ),
+                }
+                for tier in self.TIERS
+            },
+        }
+
+
+geocoder = Geocoder()
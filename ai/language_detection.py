@@ -0,0 +1,83 @@
+import threading
+
+from django.conf import settings
+from langdetect import DetectorFactory
+from langdetect.detector_factory import PROFILES_DIRECTORY
+from langdetect.lang_detect_exception import LangDetectException
+
+from ai.models import Languages
+
+SUPPORTED_LANGUAGES = {language.value for language in Languages}
+
+_factory = None
+_factory_lock = threading.Lock()
+
+
+def _get_factory() -> DetectorFactory:
+    global _factory
+    if _factory is None:
+        with _factory_lock:
+            if _factory is None:
+                factory = DetectorFactory()
+                factory.load_profile(PROFILES_DIRECTORY)
+                factory.set_seed(0)
+                _factory = factory
+    return _factory
+
+
+def normalize_language(code: str | None) -> str | None:
+    """
+    Strip the region (e.g. zh-CN) and drop languages the bot does not support
+    """
+    if not code:
+        return None
+    code = code.split("-")[0].lower()
+    return code if code in SUPPORTED_LANGUAGES else None
+
+
+def should_detect(content: str) -> bool:
+    """
+    Menu picks, numbers and very short replies carry no language signal
+    """
+    content = (content or "").strip()
+    letters = sum(character.isalpha() for character in content)
+    return letters >= settings.LANGUAGE_DETECTION_MIN_CHARS
+
+
+def detect_local(content: str) -> tuple[str | None, float]:
+    """
+    In-process detection with langdetect, returns the supported language (or
+    None) and the probability of the best guess
+    """
+    detector = _get_factory().create()
+    detector.append(content)
+    try:
+        best = detector.get_probabilities()[0]
+    except (LangDetectException, IndexError):
+        return None, 0.0
+    return normalize_language(best.lang), best.prob
+
+
+# ISO-639-1 codes of the language names Whisper reports, for the languages
+# the bot knows about
+WHISPER_LANGUAGE_CODES = {
+    "english": "en",
+    "spanish": "es",
+    "hindi": "hi",
+    "french": "fr",
+    "nepali": "ne",
+    "german": "de",
+    "japanese": "ja",
+    "bulgarian": "bg",
+    "hungarian": "hu",
+}
+
+
+def language_from_name(name: str | None) -> str | None:
+    """
+    Supported language code for a language name as reported by Whisper
+    (e.g. "german"), plain codes are accepted too. Goes through
+    `normalize_language` so voice notes and text resolve the same way.
+    """
+    name = (name or "").strip().lower()
+    return normalize_language(WHISPER_LANGUAGE_CODES.get(name, name))
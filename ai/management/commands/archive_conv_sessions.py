@@ -0,0 +1,37 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ai.archive import archive_cold_sessions
+from ai.models import OpenAiConvSession
+
+
+class Command(BaseCommand):
+    help = "Move cold conversation sessions into the compressed archive table"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.SESSION_ARCHIVE_AFTER_DAYS,
+            help="Archive sessions older than this many days",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many sessions are older than the cutoff",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+
+        if options["dry_run"]:
+            count = OpenAiConvSession.objects.filter(created_date__lt=cutoff).count()
+            self.stdout.write(f"{count} sessions older than {cutoff:%Y-%m-%d}")
+            return
+
+        archived = archive_cold_sessions(cutoff, batch_size=options["batch_size"])
+        self.stdout.write(f"Archived {archived} sessions older than {cutoff:%Y-%m-%d}")
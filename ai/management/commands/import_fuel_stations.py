@@ -0,0 +1,67 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from ai.fuel_stations import fuel_stations
+from ai.models import FuelStation
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import fuel stations from a CSV file with place_id, name, brand, "
+        "address, latitude, longitude, diesel_price and price_updated_date columns"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV file to import")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows per upsert statement",
+        )
+
+    def _price_date(self, value: str | None) -> datetime:
+        """
+        Reported time of the price, naive times are taken as local time
+        """
+        reported = parse_datetime(value or "")
+        if reported is None:
+            return timezone.now()
+        return (
+            timezone.make_aware(reported) if timezone.is_naive(reported) else reported
+        )
+
+    def _station(self, row: dict) -> FuelStation:
+        price = row.get("diesel_price") or None
+        return FuelStation(
+            place_id=row["place_id"],
+            name=row["name"],
+            brand=row.get("brand", ""),
+            address=row.get("address", ""),
+            latitude=float(row["latitude"]),
+            longitude=float(row["longitude"]),
+            diesel_price=Decimal(price) if price else None,
+            price_updated_date=(
+                self._price_date(row.get("price_updated_date")) if price else None
+            ),
+        )
+
+    def handle(self, *args, **options):
+        stations = {}
+        try:
+            with open(options["path"], newline="", encoding="utf-8") as stations_file:
+                for line, row in enumerate(csv.DictReader(stations_file), start=2):
+                    try:
+                        stations[row["place_id"]] = self._station(row)
+                    except (KeyError, ValueError, InvalidOperation) as e:
+                        self.stderr.write(f"Skipping line {line}: {e!r}")
+        except OSError as e:
+            raise CommandError(e)
+
+        fuel_stations.save(list(stations.values()), batch_size=options["batch_size"])
+        self.stdout.write(f"Imported {len(stations)} fuel stations")
@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from ai.briefings import active_drivers, save_briefings
+from ai.models import Languages, RouteBriefing
+from ai.preferences import get_user_language
+from ai.util import ConversationUtil, TranslationTranscriptionUtil
+
+
+class Command(BaseCommand):
+    help = (
+        "Precompute each driver's route briefing (route link, fuel stop and "
+        "delivery instructions) in english and the driver's language"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--date",
+            type=date.fromisoformat,
+            help="Day of the briefing (YYYY-MM-DD), today by default",
+        )
+        parser.add_argument(
+            "--active-days",
+            type=int,
+            default=7,
+            help="Include drivers who wrote in the last days",
+        )
+        parser.add_argument("--users", nargs="*", help="Only precompute these drivers")
+
+    def handle(self, *args, **options):
+        route_date = options["date"] or timezone.localdate()
+        drivers = options["users"] or active_drivers(options["active_days"])
+
+        # Briefings per route and language, shared by drivers on the same route.
+        # Only the first driver of a route needs a ConversationUtil.
+        translation_util = TranslationTranscriptionUtil()
+        messages = {}
+        briefings = []
+        for user in drivers:
+            try:
+                route = ConversationUtil.route_of(user)
+                if not route:
+                    continue
+                route_messages = messages.setdefault(route, {})
+                if Languages.ENGLISH.value not in route_messages:
+                    route_messages[Languages.ENGLISH.value] = ConversationUtil(
+                        user
+                    ).route_briefing(*route)
+
+                for language in {Languages.ENGLISH.value, get_user_language(user)}:
+                    if language not in route_messages:
+                        route_messages[language] = translation_util._translate(
+                            route_messages[Languages.ENGLISH.value], "en", language
+                        )
+                    briefings.append(
+                        RouteBriefing(
+                            user=user,
+                            route_date=route_date,
+                            language=language,
+                            origin=route[0],
+                            destination=route[1],
+                            message=route_messages[language],
+                        )
+                    )
+            except Exception as e:
+                self.stderr.write(f"Failed to brief {user}: {e}")
+
+        deleted = save_briefings(briefings)
+        self.stdout.write(
+            f"Stored {len(briefings)} briefings for {len(drivers)} drivers "
+            f"on {route_date}, dropped {deleted} old ones"
+        )
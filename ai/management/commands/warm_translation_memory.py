@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from ai.models import Languages
+from ai.translation_memory import translation_memory
+from ai.util import ConversationUtil, TranslationTranscriptionUtil
+
+
+class Command(BaseCommand):
+    help = "Precompute translations of the fixed menu strings for every language"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--evict",
+            action="store_true",
+            help="Drop expired and least recently used entries first",
+        )
+
+    def handle(self, *args, **options):
+        if options["evict"]:
+            deleted = translation_memory.evict()
+            self.stdout.write(f"Evicted {deleted} translation memory entries")
+
+        translation_util = TranslationTranscriptionUtil()
+        messages = ConversationUtil.fixed_messages()
+
+        for language in Languages:
+            if language == Languages.ENGLISH:
+                continue
+            try:
+                # One Translate request per language, cached strings are skipped
+                translation_util._translate_batch(messages, "en", language.value)
+            except Exception as e:
+                self.stderr.write(f"Failed to warm {language.value}: {e}")
+                continue
+            self.stdout.write(f"Warmed {len(messages)} messages for {language.value}")
+
+        self.stdout.write(str(translation_memory.stats()))
@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0004_alter_userpreference_language"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConversationSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("user", models.CharField(max_length=15, unique=True)),
+                ("summary", models.TextField(blank=True)),
+                ("last_session_id", models.BigIntegerField(default=0)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0005_conversationsummary"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="openaiconvsession",
+            index=models.Index(
+                fields=["user", "created_date"], name="ai_openaico_user_19983e_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:31
+
+from django.db import migrations, models
+
+# PostgreSQL requires the partition key in the primary key of a partitioned table
+PARTITIONED_TABLE_SQL = """
+CREATE TABLE "ai_archivedconvsession" (
+    "id" bigserial NOT NULL,
+    "user" varchar(15) NOT NULL,
+    "period" date NOT NULL,
+    "first_session_id" bigint NOT NULL,
+    "last_session_id" bigint NOT NULL,
+    "row_count" integer NOT NULL CHECK ("row_count" >= 0),
+    "payload" bytea NOT NULL,
+    "archived_date" timestamp with time zone NOT NULL,
+    PRIMARY KEY ("id", "period")
+) PARTITION BY RANGE ("period");
+CREATE TABLE "ai_archivedconvsession_default"
+    PARTITION OF "ai_archivedconvsession" DEFAULT;
+"""
+
+
+def create_archive_table(apps, schema_editor):
+    model = apps.get_model("ai", "ArchivedConvSession")
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(PARTITIONED_TABLE_SQL)
+    else:
+        schema_editor.create_model(model)
+
+
+def drop_archive_table(apps, schema_editor):
+    schema_editor.delete_model(apps.get_model("ai", "ArchivedConvSession"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0006_openaiconvsession_user_created_date_index"),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name="ArchivedConvSession",
+                    fields=[
+                        (
+                            "id",
+                            models.BigAutoField(
+                                auto_created=True,
+                                primary_key=True,
+                                serialize=False,
+                                verbose_name="ID",
+                            ),
+                        ),
+                        ("user", models.CharField(max_length=15)),
+                        ("period", models.DateField()),
+                        ("first_session_id", models.BigIntegerField()),
+                        ("last_session_id", models.BigIntegerField()),
+                        ("row_count", models.PositiveIntegerField()),
+                        ("payload", models.BinaryField()),
+                        ("archived_date", models.DateTimeField(auto_now_add=True)),
+                    ],
+                ),
+            ],
+        ),
+        migrations.RunPython(create_archive_table, drop_archive_table),
+        migrations.AddIndex(
+            model_name="archivedconvsession",
+            index=models.Index(
+                fields=["user", "period"], name="ai_archived_user_46bb57_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:32
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_preferences(apps, schema_editor):
+    """
+    Keep only the most recent preference per user before adding the constraint
+    """
+    UserPreference = apps.get_model("ai", "UserPreference")
+    latest_ids = (
+        UserPreference.objects.values("user")
+        .annotate(latest_id=Max("id"))
+        .values_list("latest_id", flat=True)
+    )
+    UserPreference.objects.exclude(id__in=list(latest_ids)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0007_archivedconvsession"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_preferences, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="userpreference",
+            name="user",
+            field=models.CharField(max_length=15, unique=True),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0008_userpreference_unique_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TranslationMemoryEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("source_hash", models.CharField(max_length=64)),
+                ("source_lang", models.CharField(max_length=20)),
+                ("target_lang", models.CharField(max_length=20)),
+                ("source_text", models.TextField()),
+                ("translated_text", models.TextField()),
+                ("created_date", models.DateTimeField(auto_now_add=True)),
+                ("last_used_date", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["last_used_date"], name="ai_translat_last_us_303f56_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("source_hash", "source_lang", "target_lang"),
+                        name="unique_translation_memory_entry",
+                    )
+                ],
+            },
+        ),
+    ]
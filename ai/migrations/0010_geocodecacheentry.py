@@ -0,0 +1,31 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0009_translationmemoryentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GeocodeCacheEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("query", models.CharField(max_length=255, unique=True)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0010_geocodecacheentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FuelStation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("place_id", models.CharField(max_length=255, unique=True)),
+                ("name", models.CharField(max_length=255)),
+                ("brand", models.CharField(blank=True, max_length=100)),
+                ("address", models.CharField(blank=True, max_length=500)),
+                ("latitude", models.FloatField()),
+                ("longitude", models.FloatField()),
+                (
+                    "diesel_price",
+                    models.DecimalField(
+                        blank=True, decimal_places=3, max_digits=6, null=True
+                    ),
+                ),
+                ("price_updated_date", models.DateTimeField(blank=True, null=True)),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
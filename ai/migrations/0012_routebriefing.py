@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0011_fuelstation"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RouteBriefing",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("user", models.CharField(max_length=15)),
+                ("route_date", models.DateField()),
+                ("language", models.CharField(max_length=20)),
+                ("origin", models.CharField(max_length=255)),
+                ("destination", models.CharField(max_length=255)),
+                ("message", models.TextField()),
+                ("updated_date", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "route_date", "language"),
+                        name="unique_route_briefing",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.7 on 2026-10-17 00:21
+
+from django.db import migrations, models
+
+
+def use_iso_german_code(apps, schema_editor):
+    """
+    German was stored as "ge", which Google Translate rejects. Move
+    preferences to "de" and drop translations and briefings made for "ge".
+    """
+    apps.get_model("ai", "UserPreference").objects.filter(language="ge").update(
+        language="de"
+    )
+    apps.get_model("ai", "TranslationMemoryEntry").objects.filter(
+        target_lang="ge"
+    ).delete()
+    apps.get_model("ai", "RouteBriefing").objects.filter(language="ge").delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ai", "0012_routebriefing"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userpreference",
+            name="language",
+            field=models.CharField(
+                choices=[
+                    ("en", "English"),
+                    ("es", "Spanish"),
+                    ("hi", "Hindi"),
+                    ("fr", "French"),
+                    ("ne", "Nepali"),
+                    ("de", "German"),
+                    ("ja", "Japanese"),
+                    ("bg", "Bulgarian"),
+                    ("hu", "Hungarian"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(use_iso_german_code, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,7 @@
 # Create your models here.
+import json
+import zlib
+
 from django.db import models
 
 
@@ -15,14 +18,14 @@ class Languages(models.TextChoices):
     HINDI = "hi"
     FRENCH = "fr"
     NEPALI = "ne"
-    GERMAN = "ge"
+    GERMAN = "de"
     JAPANESE = "ja"
     BULGARIAN = "bg"
     HUNGARIAN = "hu"
 
 
 class UserPreference(models.Model):
-    user = models.CharField(max_length=15)
+    user = models.CharField(max_length=15, unique=True)
     language = models.CharField(max_length=20, choices=Languages.choices)
 
 
@@ -31,3 +34,118 @@ class OpenAiConvSession(models.Model):
     message = models.TextField()
     role = models.CharField(max_length=10, choices=SessionRole.choices)
     created_date = models.DateTimeField(auto_created=True, auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "created_date"])]
+
+
+class ConversationSummary(models.Model):
+    """
+    Rolling summary of the conversation turns that fell out of the context window
+    """
+
+    user = models.CharField(max_length=15, unique=True)
+    summary = models.TextField(blank=True)
+    last_session_id = models.BigIntegerField(default=0)
+    updated_date = models.DateTimeField(auto_now=True)
+
+
+class ArchivedConvSession(models.Model):
+    """
+    Compressed batch of cold OpenAiConvSession rows for one user and month.
+    On PostgreSQL the table is range partitioned by `period`.
+    """
+
+    user = models.CharField(max_length=15)
+    period = models.DateField()
+    first_session_id = models.BigIntegerField()
+    last_session_id = models.BigIntegerField()
+    row_count = models.PositiveIntegerField()
+    payload = models.BinaryField()
+    archived_date = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "period"])]
+
+    @staticmethod
+    def compress(sessions: list[dict]) -> bytes:
+        return zlib.compress(json.dumps(sessions, default=str).encode("utf-8"))
+
+    def sessions(self) -> list[dict]:
+        return json.loads(zlib.decompress(bytes(self.payload)).decode("utf-8"))
+
+
+class TranslationMemoryEntry(models.Model):
+    """
+    Persistent tier of the translation memory, keyed by source text hash and
+    language pair
+    """
+
+    source_hash = models.CharField(max_length=64)
+    source_lang = models.CharField(max_length=20)
+    target_lang = models.CharField(max_length=20)
+    source_text = models.TextField()
+    translated_text = models.TextField()
+    created_date = models.DateTimeField(auto_now_add=True)
+    last_used_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["source_hash", "source_lang", "target_lang"],
+                name="unique_translation_memory_entry",
+            )
+        ]
+        indexes = [models.Index(fields=["last_used_date"])]
+
+
+class GeocodeCacheEntry(models.Model):
+    """
+    Persistent geocoding results keyed by the normalized place name
+    """
+
+    query = models.CharField(max_length=255, unique=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    updated_date = models.DateTimeField(auto_now=True)
+
+
+class FuelStation(models.Model):
+    """
+    Catalogue of fuel stations with their last seen diesel price, filled from
+    Places responses and bulk imports
+    """
+
+    place_id = models.CharField(max_length=255, unique=True)
+    name = models.CharField(max_length=255)
+    brand = models.CharField(max_length=100, blank=True)
+    address = models.CharField(max_length=500, blank=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    diesel_price = models.DecimalField(
+        max_digits=6, decimal_places=3, null=True, blank=True
+    )
+    price_updated_date = models.DateTimeField(null=True, blank=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+
+class RouteBriefing(models.Model):
+    """
+    Precomputed route briefing of a driver for a day in one language
+    """
+
+    user = models.CharField(max_length=15)
+    route_date = models.DateField()
+    language = models.CharField(max_length=20)
+    origin = models.CharField(max_length=255)
+    destination = models.CharField(max_length=255)
+    message = models.TextField()
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "route_date", "language"],
+                name="unique_route_briefing",
+            )
+        ]
@@ -0,0 +1,152 @@
+import asyncio
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from weakref import WeakKeyDictionary
+
+from cachetools import LRUCache
+from django.conf import settings
+
+from ai.geocoding import GeoPoint
+
+
+class PlacesCache:
+    """
+    Short-lived cache of Places nearby searches keyed by (place type,
+    quantized lat/lon cell, radius). Searches are snapped to the cell centre so
+    every driver in a cell shares one result, and concurrent identical searches
+    are coalesced into a single upstream request.
+    """
+
+    def __init__(self):
+        self._entries = LRUCache(maxsize=settings.PLACES_CACHE_SIZE)
+        self._lock = threading.Lock()
+        self._inflight: dict[tuple, Future] = {}
+        self._async_inflight: WeakKeyDictionary = WeakKeyDictionary()
+        self.counters = Counter(hits=0, misses=0, coalesced=0, errors=0)
+
+    def cell(self, place_type: str, location, radius: int) -> tuple[tuple, GeoPoint]:
+        """
+        Cache key and cell centre for a search around the location
+        """
+        size = settings.PLACES_CELL_SIZE_DEGREES
+        lat_cell = round(location.latitude / size)
+        lon_cell = round(location.longitude / size)
+        key = (place_type, lat_cell, lon_cell, radius)
+        return key, GeoPoint(lat_cell * size, lon_cell * size)
+
+    def _max_age(self, place_type: str) -> int:
+        # Fuel prices change during the day, bound their age separately
+        if place_type == "gas_station":
+            return settings.PLACES_FUEL_PRICE_TTL
+        return settings.PLACES_CACHE_TTL
+
+    def _cached(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        fetched_at, data = entry
+        if time.monotonic() - fetched_at > self._max_age(key[0]):
+            del self._entries[key]
+            return None
+        return data
+
+    def _store(self, key: tuple, data):
+        if data is not None:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), data)
+
+    def get_or_fetch(self, key: tuple, fetch):
+        """
+        Cached response for the key, otherwise call `fetch` once for all
+        concurrent callers. `fetch` returns None when the search failed.
+        """
+        with self._lock:
+            data = self._cached(key)
+            if data is not None:
+                self.counters["hits"] += 1
+                return data
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.counters["misses"] += 1
+            else:
+                self.counters["coalesced"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            data = fetch()
+            self._store(key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            self.counters["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    async def aget_or_fetch(self, key: tuple, fetch):
+        # Asyncio futures belong to one event loop, coalesce per loop
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                data = self._cached(key)
+                if data is not None:
+                    self.counters["hits"] += 1
+                    return data
+
+                inflight = self._async_inflight.setdefault(loop, {})
+                future = inflight.get(key)
+                leader = future is None
+                if leader:
+                    future = inflight[key] = loop.create_future()
+                    self.counters["misses"] += 1
+                else:
+                    self.counters["coalesced"] += 1
+
+            if leader:
+                break
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # Only retry when the leader was cancelled, not this caller
+                if not future.cancelled():
+                    raise
+
+        try:
+            data = await fetch()
+            self._store(key, data)
+            future.set_result(data)
+            return data
+        except Exception as e:
+            self.counters["errors"] += 1
+            future.set_exception(e)
+            raise
+        finally:
+            # A cancelled leader must not leave its followers waiting forever
+            if not future.done():
+                future.cancel()
+            with self._lock:
+                inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        lookups = (
+            self.counters["hits"] + self.counters["misses"] + self.counters["coalesced"]
+        )
+        return {
+            **self.counters,
+            "size": len(self._entries),
+            "hit_rate": (
+                (lookups - self.counters["misses"]) / lookups if lookups else None
+            ),
+        }
+
+
+places_cache = PlacesCache()
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from ai.models import Languages, UserPreference
+
+# Cached for users without a stored preference, so misses are cached too
+NO_PREFERENCE = ""
+
+
+def _cache_key(user: str) -> str:
+    return f"user-language:{user}"
+
+
+def _stored_language(user: str) -> str:
+    language = cache.get(_cache_key(user))
+    if language is None:
+        language = (
+            UserPreference.objects.filter(user=user)
+            .values_list("language", flat=True)
+            .first()
+        ) or NO_PREFERENCE
+        cache.set(_cache_key(user), language, settings.PREFERENCE_CACHE_TIMEOUT)
+    return language
+
+
+async def _astored_language(user: str) -> str:
+    language = await cache.aget(_cache_key(user))
+    if language is None:
+        language = (
+            await UserPreference.objects.filter(user=user)
+            .values_list("language", flat=True)
+            .afirst()
+        ) or NO_PREFERENCE
+        await cache.aset(_cache_key(user), language, settings.PREFERENCE_CACHE_TIMEOUT)
+    return language
+
+
+# INSERT ... ON CONFLICT (user) DO UPDATE, relies on the unique constraint
+UPSERT_OPTIONS = {
+    "update_conflicts": True,
+    "unique_fields": ["user"],
+    "update_fields": ["language"],
+}
+
+
+def get_user_language(user: str) -> str:
+    """
+    Preferred language of the user, english if none is stored
+    """
+    return _stored_language(user) or Languages.ENGLISH.value
+
+
+async def aget_user_language(user: str) -> str:
+    return await _astored_language(user) or Languages.ENGLISH.value
+
+
+def set_user_language(user: str, language: Languages) -> bool:
+    """
+    Store the preference with a single upsert, returns False when unchanged
+    """
+    if _stored_language(user) == language.value:
+        return False
+
+    UserPreference.objects.bulk_create(
+        [UserPreference(user=user, language=language.value)], **UPSERT_OPTIONS
+    )
+    cache.set(_cache_key(user), language.value, settings.PREFERENCE_CACHE_TIMEOUT)
+    return True
+
+
+async def aset_user_language(user: str, language: Languages) -> bool:
+    if await _astored_language(user) == language.value:
+        return False
+
+    await UserPreference.objects.abulk_create(
+        [UserPreference(user=user, language=language.value)], **UPSERT_OPTIONS
+    )
+    await cache.aset(
+        _cache_key(user), language.value, settings.PREFERENCE_CACHE_TIMEOUT
+    )
+    return True
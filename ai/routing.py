@@ -0,0 +1,179 @@
+import logging
+import threading
+from collections import Counter
+
+import numpy as np
+from cachetools import TTLCache
+from django.conf import settings
+from google.api_core.exceptions import GoogleAPIError
+from google.maps import routing_v2
+
+from ai.clients import clients
+from ai.geocoding import GeoPoint, geocoder, normalize_place_name
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+ROUTE_FIELD_MASK = "routes.distanceMeters,routes.polyline.encodedPolyline"
+
+
+def haversine_km(latitudes_a, longitudes_a, latitudes_b, longitudes_b):
+    """
+    Great circle distance in km between points given in radians, broadcasts
+    like any numpy expression
+    """
+    haversine = (
+        np.sin((latitudes_b - latitudes_a) / 2) ** 2
+        + np.cos(latitudes_a)
+        * np.cos(latitudes_b)
+        * np.sin((longitudes_b - longitudes_a) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(haversine))
+
+
+def decode_polyline(encoded: str) -> list[GeoPoint]:
+    """
+    Decode a Google encoded polyline into points
+    """
+    points = []
+    coordinates = [0, 0]
+    index = 0
+    while index < len(encoded):
+        for axis in range(2):
+            shift = result = 0
+            while True:
+                byte = ord(encoded[index]) - 63
+                index += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+            coordinates[axis] += ~(result >> 1) if result & 1 else result >> 1
+        points.append(GeoPoint(coordinates[0] / 1e5, coordinates[1] / 1e5))
+    return points
+
+
+def sample_polyline(
+    points: list[GeoPoint], spacing_km: float, max_samples: int
+) -> list[GeoPoint]:
+    """
+    Points spread evenly by distance along the polyline, start and end included
+    """
+    if len(points) < 2:
+        return list(points)
+
+    coordinates = np.radians(np.array(points, dtype=np.float64))
+    latitudes, longitudes = coordinates[:, 0], coordinates[:, 1]
+    segments = haversine_km(
+        latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]
+    )
+    travelled = np.concatenate([[0.0], np.cumsum(segments)])
+
+    count = min(max_samples, int(travelled[-1] // spacing_km) + 2)
+    targets = np.linspace(0.0, travelled[-1], max(count, 1))
+    indices = np.searchsorted(travelled, targets).clip(0, len(points) - 1)
+    return [points[index] for index in dict.fromkeys(indices.tolist())]
+
+
+class RoutePlanner:
+    """
+    Route polylines from the Google Routes API, cached per (origin,
+    destination), and the search points sampled along them
+    """
+
+    def __init__(self):
+        self._cache = TTLCache(
+            maxsize=settings.ROUTE_CACHE_SIZE, ttl=settings.ROUTE_CACHE_TTL
+        )
+        self._lock = threading.Lock()
+        self.counters = Counter(hits=0, misses=0, errors=0)
+
+    def _key(self, origin: str, destination: str) -> tuple:
+        return normalize_place_name(origin), normalize_place_name(destination)
+
+    def _request(self, origin: str, destination: str):
+        return routing_v2.ComputeRoutesRequest(
+            origin=routing_v2.Waypoint(address=origin),
+            destination=routing_v2.Waypoint(address=destination),
+            travel_mode=routing_v2.RouteTravelMode.DRIVE,
+        )
+
+    def _cached(self, key: tuple) -> list[GeoPoint] | None:
+        with self._lock:
+            points = self._cache.get(key)
+        self.counters["hits" if points is not None else "misses"] += 1
+        return points
+
+    def _remember(self, key: tuple, response) -> list[GeoPoint] | None:
+        if not response.routes:
+            return None
+        points = decode_polyline(response.routes[0].polyline.encoded_polyline)
+        with self._lock:
+            self._cache[key] = points
+        return points
+
+    def polyline(self, origin: str, destination: str) -> list[GeoPoint] | None:
+        key = self._key(origin, destination)
+        points = self._cached(key)
+        if points is not None:
+            return points
+
+        try:
+            response = clients.routes().compute_routes(
+                self._request(origin, destination),
+                metadata=[("x-goog-fieldmask", ROUTE_FIELD_MASK)],
+                timeout=settings.HTTP_TIMEOUT,
+            )
+        except GoogleAPIError:
+            self.counters["errors"] += 1
+            logger.exception("Could not compute route %s -> %s", origin, destination)
+            return None
+        return self._remember(key, response)
+
+    async def apolyline(self, origin: str, destination: str) -> list[GeoPoint] | None:
+        key = self._key(origin, destination)
+        points = self._cached(key)
+        if points is not None:
+            return points
+
+        try:
+            response = await clients.async_routes().compute_routes(
+                self._request(origin, destination),
+                metadata=[("x-goog-fieldmask", ROUTE_FIELD_MASK)],
+                timeout=settings.HTTP_TIMEOUT,
+            )
+        except GoogleAPIError:
+            self.counters["errors"] += 1
+            logger.exception("Could not compute route %s -> %s", origin, destination)
+            return None
+        return self._remember(key, response)
+
+    def _samples(self, points: list[GeoPoint]) -> list[GeoPoint]:
+        return sample_polyline(
+            points,
+            settings.PLACES_ROUTE_SAMPLE_SPACING_KM,
+            settings.PLACES_ROUTE_MAX_SAMPLES,
+        )
+
+    def sample_points(self, origin: str, destination: str) -> list[GeoPoint]:
+        """
+        Search points along the route, only the origin when the route is unknown
+        """
+        points = self.polyline(origin, destination)
+        if points:
+            return self._samples(points)
+        location = geocoder.geocode(origin)
+        return [location] if location else []
+
+    async def asample_points(self, origin: str, destination: str) -> list[GeoPoint]:
+        points = await self.apolyline(origin, destination)
+        if points:
+            return self._samples(points)
+        location = await geocoder.ageocode(origin)
+        return [location] if location else []
+
+    def stats(self) -> dict:
+        return {**self.counters, "size": len(self._cache)}
+
+
+route_planner = RoutePlanner()
@@ -0,0 +1,67 @@
+import re
+
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;:])\s+|\n+")
+
+
+class SentenceChunker:
+    """
+    Collects streamed text and releases it at sentence boundaries, once at
+    least `min_chars` characters are buffered
+    """
+
+    def __init__(self, min_chars: int):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text: str) -> list[str]:
+        self.buffer += text
+        chunks = []
+        while True:
+            boundary = next(
+                (
+                    match
+                    for match in SENTENCE_BOUNDARY.finditer(self.buffer)
+                    if match.start() >= self.min_chars
+                ),
+                None,
+            )
+            if boundary is None:
+                return chunks
+            chunks.append(self.buffer[: boundary.start()].strip())
+            self.buffer = self.buffer[boundary.end() :]
+
+    def flush(self) -> str:
+        text, self.buffer = self.buffer.strip(), ""
+        return text
+
+
+class ToolCallCollector:
+    """
+    Rebuilds complete tool calls from the deltas of a streamed completion
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    def feed(self, deltas):
+        for delta in deltas:
+            call = self.calls.setdefault(
+                delta.index, {"id": None, "name": "", "arguments": ""}
+            )
+            call["id"] = delta.id or call["id"]
+            if delta.function:
+                call["name"] += delta.function.name or ""
+                call["arguments"] += delta.function.arguments or ""
+
+    def tool_calls(self) -> list[ChatCompletionMessageToolCall]:
+        return [
+            ChatCompletionMessageToolCall(
+                id=call["id"],
+                type="function",
+                function=Function(name=call["name"], arguments=call["arguments"]),
+            )
+            for _, call in sorted(self.calls.items())
+        ]
@@ -1 +1,324 @@
-# Create your tests here.
+import io
+import json
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from ai.archive import archive_user_sessions
+from ai.briefings import save_briefings
+from ai.clients import clients
+from ai.constants import AI_PROMPT
+from ai.context import ConversationContext
+from ai.fuel_stations import FuelStationIndex
+from ai.geocoding import GeoPoint
+from ai.language_detection import detect_local, language_from_name
+from ai.models import (
+    ArchivedConvSession,
+    ConversationSummary,
+    FuelStation,
+    OpenAiConvSession,
+    RouteBriefing,
+    SessionRole,
+    UserPreference,
+)
+from ai.util import ConversationUtil
+
+USER = "+100"
+
+
+def completion(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@override_settings(CONTEXT_SUMMARY_MAX_ROWS=50)
+class ConversationContextTests(TestCase):
+    def setUp(self):
+        self.sessions = [
+            OpenAiConvSession.objects.create(
+                user=USER,
+                role=SessionRole.USER if index % 2 == 0 else SessionRole.ASSISTANT,
+                message=f"turn {index}",
+            )
+            for index in range(10)
+        ]
+        patcher = mock.patch.object(clients, "openai")
+        self.openai = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.openai.chat.completions.create.return_value = completion("summary")
+
+    def test_loads_the_newest_turns_in_order(self):
+        context = ConversationContext(USER, max_turns=3)
+        messages = context.load()
+
+        self.assertEqual(messages[0], {"role": "system", "content": AI_PROMPT})
+        self.assertEqual(
+            [message["content"] for message in messages[1:]],
+            ["turn 7", "turn 8", "turn 9"],
+        )
+        self.assertEqual(context.oldest_window_id, self.sessions[7].id)
+
+    def test_token_budget_trims_the_window(self):
+        context = ConversationContext(USER, max_turns=10, token_budget=1)
+        messages = context.load()
+
+        # The newest turn is always kept
+        self.assertEqual([message["content"] for message in messages[1:]], ["turn 9"])
+
+    def test_refresh_folds_every_turn_before_the_window(self):
+        context = ConversationContext(USER, max_turns=3)
+        context.load()
+        context.refresh_summary()
+
+        prompt = self.openai.chat.completions.create.call_args.kwargs["messages"]
+        transcript = prompt[-1]["content"]
+        for index in range(7):
+            self.assertIn(f"turn {index}\n", transcript + "\n")
+        self.assertNotIn("turn 7", transcript)
+
+        summary = ConversationSummary.objects.get(user=USER)
+        self.assertEqual(summary.summary, "summary")
+        self.assertEqual(summary.last_session_id, self.sessions[6].id)
+
+        # The summary is loaded with the window and nothing is left to fold
+        messages = context.load()
+        self.assertIn("summary", messages[1]["content"])
+        context.refresh_summary()
+        self.assertEqual(self.openai.chat.completions.create.call_count, 1)
+
+    @override_settings(CONTEXT_SUMMARY_MAX_ROWS=4)
+    def test_refresh_folds_large_gaps_over_several_turns(self):
+        context = ConversationContext(USER, max_turns=3)
+        context.load()
+
+        context.refresh_summary()
+        summary = ConversationSummary.objects.get(user=USER)
+        self.assertEqual(summary.last_session_id, self.sessions[3].id)
+
+        context.refresh_summary()
+        summary.refresh_from_db()
+        self.assertEqual(summary.last_session_id, self.sessions[6].id)
+
+    def test_failed_refresh_keeps_the_summary(self):
+        self.openai.chat.completions.create.side_effect = RuntimeError("boom")
+        context = ConversationContext(USER, max_turns=3)
+        context.load()
+
+        with self.assertLogs("ai.context", "ERROR"):
+            context.refresh_summary()
+
+        summary = ConversationSummary.objects.get(user=USER)
+        self.assertEqual(summary.last_session_id, 0)
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.sessions = [
+            OpenAiConvSession.objects.create(
+                user=USER, role=SessionRole.USER, message=f"turn {index}"
+            )
+            for index in range(10)
+        ]
+        self.cutoff = timezone.now() + timedelta(days=1)
+
+    def hot_ids(self):
+        return list(
+            OpenAiConvSession.objects.order_by("id").values_list("id", flat=True)
+        )
+
+    def test_unsummarized_sessions_stay_hot(self):
+        self.assertEqual(archive_user_sessions(USER, self.cutoff, 100, 3), 0)
+        self.assertEqual(len(self.hot_ids()), 10)
+
+    def test_archives_summarized_sessions_outside_the_window(self):
+        ConversationSummary.objects.create(
+            user=USER, summary="summary", last_session_id=self.sessions[4].id
+        )
+
+        self.assertEqual(archive_user_sessions(USER, self.cutoff, 2, 3), 5)
+        self.assertEqual(self.hot_ids(), [session.id for session in self.sessions[5:]])
+        archived = ArchivedConvSession.objects.order_by("first_session_id")
+        rows = [row for archive in archived for row in archive.sessions()]
+        self.assertEqual(
+            [row["message"] for row in rows], [f"turn {i}" for i in range(5)]
+        )
+
+    def test_keeps_the_window_when_everything_is_summarized(self):
+        ConversationSummary.objects.create(
+            user=USER, summary="summary", last_session_id=self.sessions[-1].id
+        )
+
+        self.assertEqual(archive_user_sessions(USER, self.cutoff, 100, 3), 7)
+        self.assertEqual(self.hot_ids(), [session.id for session in self.sessions[7:]])
+
+
+class LanguageDetectionTests(SimpleTestCase):
+    def test_whisper_names_resolve_to_supported_codes(self):
+        self.assertEqual(language_from_name("german"), "de")
+        self.assertEqual(language_from_name("Spanish"), "es")
+        self.assertEqual(language_from_name("de"), "de")
+        self.assertIsNone(language_from_name("klingon"))
+
+    def test_german_text_is_detected(self):
+        language, probability = detect_local(
+            "Wo ist die nächste Tankstelle auf meiner Route nach Wien?"
+        )
+        self.assertEqual(language, "de")
+        self.assertGreater(probability, 0.9)
+
+
+class RouteBriefingTests(TestCase):
+    def briefing(self, user: str, days: int) -> RouteBriefing:
+        return RouteBriefing(
+            user=user,
+            route_date=timezone.localdate() + timedelta(days=days),
+            language="en",
+            origin="Berlin",
+            destination="Vienna",
+            message="Route sent!",
+        )
+
+    def test_precomputing_tomorrow_keeps_todays_briefings(self):
+        RouteBriefing.objects.bulk_create(
+            [self.briefing("+1", -1), self.briefing("+1", 0)]
+        )
+
+        self.assertEqual(save_briefings([self.briefing("+1", 1)]), 1)
+        self.assertEqual(
+            sorted(RouteBriefing.objects.values_list("route_date", flat=True)),
+            [timezone.localdate(), timezone.localdate() + timedelta(days=1)],
+        )
+
+    @mock.patch(
+        "ai.management.commands.precompute_route_briefings.TranslationTranscriptionUtil"
+    )
+    @mock.patch("ai.management.commands.precompute_route_briefings.ConversationUtil")
+    def test_one_conversation_util_per_route(self, conversation_util, translation_util):
+        routes = {"+1": ("Berlin", "Vienna"), "+2": ("Berlin", "Vienna"), "+3": None}
+        conversation_util.route_of.side_effect = routes.get
+        conversation_util.return_value.route_briefing.return_value = "Route sent!"
+        translation_util.return_value._translate.return_value = "Route gesendet!"
+        UserPreference.objects.create(user="+2", language="de")
+
+        call_command(
+            "precompute_route_briefings", users=list(routes), stdout=io.StringIO()
+        )
+
+        conversation_util.assert_called_once_with("+1")
+        self.assertEqual(
+            sorted(RouteBriefing.objects.values_list("user", "language", "message")),
+            [
+                ("+1", "en", "Route sent!"),
+                ("+2", "de", "Route gesendet!"),
+                ("+2", "en", "Route sent!"),
+            ],
+        )
+
+
+class FuelStationIndexTests(TestCase):
+    route = [GeoPoint(52.52, 13.40), GeoPoint(52.60, 13.50)]
+
+    def setUp(self):
+        self.index = FuelStationIndex()
+
+    def station(self, place_id: str, latitude: float, hours_ago: float, price="1.60"):
+        return FuelStation(
+            place_id=place_id,
+            name=place_id,
+            latitude=latitude,
+            longitude=13.40,
+            diesel_price=Decimal(price),
+            price_updated_date=timezone.now() - timedelta(hours=hours_ago),
+        )
+
+    def test_nearest_serves_fresh_prices_without_refresh(self):
+        self.index.save([self.station("near", 52.53, 1), self.station("far", 53.50, 1)])
+        refresh = mock.Mock()
+
+        stations = self.index.nearest(self.route, 3, refresh=refresh)
+
+        self.assertEqual([record.place_id for record, _ in stations], ["near"])
+        refresh.assert_not_called()
+        self.assertEqual(self.index.counters["api_fallbacks"], 0)
+
+    def test_stale_prices_are_refreshed_once(self):
+        self.index.save([self.station("near", 52.53, 48)])
+
+        def refresh():
+            self.index.save([self.station("near", 52.53, 0, price="1.50")])
+
+        stations = self.index.nearest(self.route, 3, refresh=refresh)
+
+        self.assertEqual(stations[0][0].diesel_price, Decimal("1.50"))
+        self.assertEqual(self.index.counters["api_fallbacks"], 1)
+
+    def test_import_makes_price_times_aware(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as stations_file:
+            stations_file.write(
+                "place_id,name,latitude,longitude,diesel_price,price_updated_date\n"
+                "a,A,52.53,13.40,1.60,2026-10-17 08:00:00\n"
+                "b,B,52.54,13.40,1.70,2026-10-17T08:00:00+02:00\n"
+            )
+            stations_file.flush()
+            call_command(
+                "import_fuel_stations", stations_file.name, stdout=io.StringIO()
+            )
+
+        for station in FuelStation.objects.all():
+            self.assertTrue(timezone.is_aware(station.price_updated_date))
+
+
+class CorridorSearchTests(SimpleTestCase):
+    repair = [{"id": "r", "name": "Repair", "distance": 1.0, "link": "link"}]
+
+    def setUp(self):
+        # The handlers under test need no clients or conversation context
+        self.util = ConversationUtil.__new__(ConversationUtil)
+        self.util.user = USER
+        self.util.messages = []
+        self.util.pending_history = []
+        self.util.prefetched_places = {}
+        self.searches = []
+        self.util.search_places_along_route = self.search
+        patcher = mock.patch("ai.util.route_planner.sample_points", return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, place_types, origin, destination):
+        self.searches.append(list(place_types))
+        return {place_type: self.repair for place_type in place_types}
+
+    def tool_calls(self):
+        arguments = json.dumps({"origin": "Berlin", "destination": "Vienna"})
+        return [
+            SimpleNamespace(function=SimpleNamespace(name=name, arguments=arguments))
+            for name in ("get_gas_stations", "get_repair_stations")
+        ]
+
+    def run_turn(self, stale: bool) -> str:
+        def nearest(points, count, max_price, refresh=None):
+            if stale:
+                refresh()
+            return []
+
+        with mock.patch("ai.util.fuel_stations.nearest", side_effect=nearest):
+            return self.util._process_tool_calls(self.tool_calls())
+
+    def test_stale_fuel_prices_share_the_repair_search(self):
+        reply = self.run_turn(stale=True)
+
+        self.assertEqual(self.searches, [["gas_station", "car_repair"]])
+        self.assertIn("Repair", reply)
+        self.assertEqual(self.util.prefetched_places, {})
+
+    def test_fresh_fuel_prices_only_search_repair(self):
+        reply = self.run_turn(stale=False)
+
+        self.assertEqual(self.searches, [["car_repair"]])
+        self.assertIn("Repair", reply)
@@ -0,0 +1,238 @@
+import hashlib
+import threading
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils import timezone
+
+from ai.models import Languages, TranslationMemoryEntry
+
+UPSERT_OPTIONS = {
+    "update_conflicts": True,
+    "unique_fields": ["source_hash", "source_lang", "target_lang"],
+    "update_fields": ["translated_text", "last_used_date"],
+}
+
+
+def source_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class TranslationMemory:
+    """
+    Two tier translation memory: an in-process LRU with TTL in front of the
+    TranslationMemoryEntry table. Keys are (source text hash, source language,
+    target language). Only the bot's own english strings reach the table,
+    pinned fixed strings and short templates, never driver messages or long
+    free-form replies. The table is evicted every
+    TRANSLATION_MEMORY_EVICT_EVERY written rows.
+    """
+
+    def __init__(self, maxsize: int = None, ttl: int = None):
+        self._cache = TTLCache(
+            maxsize=maxsize or settings.TRANSLATION_MEMORY_LRU_SIZE,
+            ttl=ttl or settings.TRANSLATION_MEMORY_LRU_TTL,
+        )
+        self._lock = threading.Lock()
+        self._pinned: set[str] = set()
+        self._writes = 0
+        self.counters = Counter(memory_hits=0, db_hits=0, misses=0)
+
+    def pin(self, texts):
+        """
+        Fixed strings kept in the table whatever their length
+        """
+        self._pinned.update(texts)
+
+    def _persistent(self, text: str, source_lang: str) -> bool:
+        if source_lang != Languages.ENGLISH.value:
+            return False
+        return (
+            text in self._pinned
+            or len(text) <= settings.TRANSLATION_MEMORY_PERSIST_MAX_CHARS
+        )
+
+    def _count_writes(self, written: int) -> bool:
+        """
+        Whether the writes crossed the eviction threshold
+        """
+        with self._lock:
+            self._writes += written
+            if self._writes < settings.TRANSLATION_MEMORY_EVICT_EVERY:
+                return False
+            self._writes = 0
+            return True
+
+    def _key(self, text: str, source_lang: str, target_lang: str) -> tuple:
+        return source_hash(text), source_lang, target_lang
+
+    def _db_cutoff(self):
+        return timezone.now() - timedelta(days=settings.TRANSLATION_MEMORY_TTL_DAYS)
+
+    def _from_memory(self, keys: dict[str, tuple]) -> dict[str, str]:
+        found = {}
+        with self._lock:
+            for text, key in keys.items():
+                translated = self._cache.get(key)
+                if translated is not None:
+                    found[text] = translated
+        self.counters["memory_hits"] += len(found)
+        return found
+
+    def _remember(self, key: tuple, translated: str):
+        with self._lock:
+            self._cache[key] = translated
+
+    def _entries_query(self, hashes: list[str], source_lang: str, target_lang: str):
+        return TranslationMemoryEntry.objects.filter(
+            source_hash__in=hashes,
+            source_lang=source_lang,
+            target_lang=target_lang,
+            last_used_date__gte=self._db_cutoff(),
+        ).values_list("id", "source_hash", "translated_text")
+
+    def _entries(self, translations: dict[str, str], source_lang, target_lang):
+        return [
+            TranslationMemoryEntry(
+                source_hash=source_hash(text),
+                source_lang=source_lang,
+                target_lang=target_lang,
+                source_text=text,
+                translated_text=translated,
+            )
+            for text, translated in translations.items()
+        ]
+
+    def _apply_db_rows(self, keys, rows, found) -> list[int]:
+        by_hash = {source_key[0]: text for text, source_key in keys.items()}
+        used_ids = []
+        for entry_id, entry_hash, translated in rows:
+            text = by_hash.get(entry_hash)
+            if text is not None and text not in found:
+                found[text] = translated
+                self._remember(keys[text], translated)
+                used_ids.append(entry_id)
+        self.counters["db_hits"] += len(used_ids)
+        return used_ids
+
+    def get_many(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> dict[str, str]:
+        """
+        Cached translations for the texts, missing texts are left out
+        """
+        keys = {text: self._key(text, source_lang, target_lang) for text in texts}
+        found = self._from_memory(keys)
+
+        missing = {
+            text: key
+            for text, key in keys.items()
+            if text not in found and self._persistent(text, source_lang)
+        }
+        if missing:
+            rows = self._entries_query(
+                [key[0] for key in missing.values()], source_lang, target_lang
+            )
+            used_ids = self._apply_db_rows(missing, rows, found)
+            if used_ids:
+                TranslationMemoryEntry.objects.filter(id__in=used_ids).update(
+                    last_used_date=timezone.now()
+                )
+
+        self.counters["misses"] += len(keys) - len(found)
+        return found
+
+    async def aget_many(
+        self, texts: list[str], source_lang: str, target_lang: str
+    ) -> dict[str, str]:
+        keys = {text: self._key(text, source_lang, target_lang) for text in texts}
+        found = self._from_memory(keys)
+
+        missing = {
+            text: key
+            for text, key in keys.items()
+            if text not in found and self._persistent(text, source_lang)
+        }
+        if missing:
+            rows = [
+                row
+                async for row in self._entries_query(
+                    [key[0] for key in missing.values()], source_lang, target_lang
+                )
+            ]
+            used_ids = self._apply_db_rows(missing, rows, found)
+            if used_ids:
+                await TranslationMemoryEntry.objects.filter(id__in=used_ids).aupdate(
+                    last_used_date=timezone.now()
+                )
+
+        self.counters["misses"] += len(keys) - len(found)
+        return found
+
+    def _persisted(self, translations: dict[str, str], source_lang, target_lang):
+        for text, translated in translations.items():
+            self._remember(self._key(text, source_lang, target_lang), translated)
+        return self._entries(
+            {
+                text: translated
+                for text, translated in translations.items()
+                if self._persistent(text, source_lang)
+            },
+            source_lang,
+            target_lang,
+        )
+
+    def set_many(
+        self, translations: dict[str, str], source_lang: str, target_lang: str
+    ):
+        entries = self._persisted(translations, source_lang, target_lang)
+        if not entries:
+            return
+        TranslationMemoryEntry.objects.bulk_create(entries, **UPSERT_OPTIONS)
+        if self._count_writes(len(entries)):
+            self.evict()
+
+    async def aset_many(
+        self, translations: dict[str, str], source_lang: str, target_lang: str
+    ):
+        entries = self._persisted(translations, source_lang, target_lang)
+        if not entries:
+            return
+        await TranslationMemoryEntry.objects.abulk_create(entries, **UPSERT_OPTIONS)
+        if self._count_writes(len(entries)):
+            await sync_to_async(self.evict)()
+
+    def evict(self) -> int:
+        """
+        Drop expired entries and the least recently used ones above the size limit
+        """
+        deleted, _ = TranslationMemoryEntry.objects.filter(
+            last_used_date__lt=self._db_cutoff()
+        ).delete()
+
+        max_rows = settings.TRANSLATION_MEMORY_MAX_ROWS
+        boundary = list(
+            TranslationMemoryEntry.objects.order_by("-last_used_date").values_list(
+                "last_used_date", flat=True
+            )[max_rows : max_rows + 1]
+        )
+        if boundary:
+            deleted += TranslationMemoryEntry.objects.filter(
+                last_used_date__lte=boundary[0]
+            ).delete()[0]
+        return deleted
+
+    def stats(self) -> dict:
+        lookups = sum(self.counters.values())
+        hits = self.counters["memory_hits"] + self.counters["db_hits"]
+        return {
+            **self.counters,
+            "memory_size": len(self._cache),
+            "hit_rate": hits / lookups if lookups else None,
+        }
+
+
+translation_memory = TranslationMemory()
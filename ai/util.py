@@ -2,24 +2,46 @@ import io
 import json
 import logging
 import math
-import os
 import urllib.parse
-import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from typing import Literal
-from urllib.request import urlopen
 
-import requests
 from django.conf import settings
-from geopy.geocoders import Nominatim
+from django.db import connections
 from google.cloud.translate_v2 import Client
 from openai import OpenAI
 from openai.types.chat import ChatCompletionMessageToolCall
 
-from ai.constants import AI_PROMPT, TOOLS
-from ai.models import Languages, OpenAiConvSession, SessionRole, UserPreference
+from ai.audio_store import audio_store
+from ai.briefings import get_briefing
+from ai.clients import clients
+from ai.constants import (
+    DELIVERY_INSTRUCTIONS,
+    GENERAL_DELIVERY_INSTRUCTIONS,
+    QUICK_HELP_MESSAGE,
+    TODAYS_ROUTE,
+    TOOLS,
+)
+from ai.context import ConversationContext
+from ai.fuel_stations import fuel_stations, money_amount
+from ai.language_detection import (
+    detect_local,
+    language_from_name,
+    normalize_language,
+    should_detect,
+)
+from ai.models import Languages, OpenAiConvSession, SessionRole
+from ai.places import places_cache
+from ai.preferences import get_user_language, set_user_language
+from ai.routing import route_planner
+from ai.streaming import SentenceChunker, ToolCallCollector
+from ai.translation_memory import translation_memory
 
 logger = logging.getLogger(__name__)
 
+AudioTranscript = namedtuple("AudioTranscript", ["text", "language", "english"])
+
 
 class TranslationTranscriptionUtil:
     open_ai_client: OpenAI
@@ -29,10 +51,8 @@ class TranslationTranscriptionUtil:
     SPEECH_SETTINGS = {"model": "tts-1", "voice": "echo"}
 
     def __init__(self):
-        self.open_ai_client = OpenAI(api_key=settings.OPEN_AI_KEY)
-        self.translation_client = Client.from_service_account_info(
-            settings.GOOGLE_SERVICE_JSON
-        )
+        self.open_ai_client = clients.openai()
+        self.translation_client = clients.translate()
 
     def _detect_language(self, content: str):
         detected_lang = self.translation_client.detect_language(content).get(
@@ -42,45 +62,123 @@ class TranslationTranscriptionUtil:
             detected_lang = detected_lang.split("-")[0]
         return detected_lang
 
+    def detect_language(self, content: str) -> str | None:
+        """
+        Tiered detection: skip menu picks and short inputs, trust the local
+        detector when confident and only ask Google otherwise. Returns None
+        when the user's stored language should be kept.
+        """
+        if not should_detect(content):
+            return None
+
+        language, confidence = detect_local(content)
+        if confidence >= settings.LANGUAGE_DETECTION_CONFIDENCE:
+            return language
+
+        return normalize_language(self._detect_language(content))
+
     def _transcribe(self, audio: io.BytesIO) -> str:
         transcription = self.open_ai_client.audio.transcriptions.create(
             file=audio, **self.TRANSCRIPTION_SETTINGS
         )
         return transcription.text
 
+    def _transcribe_verbose(self, path: str) -> tuple[str, str | None]:
+        with open(path, "rb") as audio:
+            transcription = self.open_ai_client.audio.transcriptions.create(
+                file=audio,
+                response_format="verbose_json",
+                **self.TRANSCRIPTION_SETTINGS,
+            )
+        return transcription.text, language_from_name(transcription.language)
+
+    def _translate_audio(self, path: str) -> str:
+        with open(path, "rb") as audio:
+            translation = self.open_ai_client.audio.translations.create(
+                file=audio, **self.TRANSCRIPTION_SETTINGS
+            )
+        return translation.text
+
+    def transcribe_audio(self, path: str) -> AudioTranscript:
+        """
+        Transcript, language and english text of a voice note from Whisper
+        alone. The language comes with the verbose transcription. The english
+        text is the transcript of english audio or, with WHISPER_TRANSLATE,
+        Whisper's translation requested in parallel; otherwise it is None.
+        """
+        if not settings.WHISPER_TRANSLATE:
+            text, language = self._transcribe_verbose(path)
+            return AudioTranscript(text, language, text if language == "en" else None)
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            translation = pool.submit(self._translate_audio, path)
+            text, language = self._transcribe_verbose(path)
+            english = text if language == "en" else translation.result()
+        return AudioTranscript(text, language, english)
+
+    def _translate_batch(
+        self, segments: list[str], source_lang: str, destination_lang: str
+    ) -> list[str]:
+        """
+        Translate a list of segments with at most one Translate API request,
+        segments found in the translation memory are not sent
+        """
+        texts = list(dict.fromkeys(segment for segment in segments if segment))
+        translations = translation_memory.get_many(texts, source_lang, destination_lang)
+
+        missing = [text for text in texts if text not in translations]
+        if missing:
+            results = self.translation_client.translate(
+                missing,
+                source_language=source_lang,
+                target_language=destination_lang,
+            )
+            new_translations = {
+                text: result["translatedText"] for text, result in zip(missing, results)
+            }
+            translation_memory.set_many(new_translations, source_lang, destination_lang)
+            translations.update(new_translations)
+
+        return [translations.get(segment, segment) for segment in segments]
+
     def _translate(
         self, source_text: str, source_lang: str, destination_lang: str
     ) -> str:
-        result = self.translation_client.translate(
-            source_text,
-            source_language=source_lang,
-            target_language=destination_lang,
-        )
-        return result["translatedText"]
+        return self._translate_batch([source_text], source_lang, destination_lang)[0]
 
-    def _generate_audio(self, input: str):
-
-        with self.open_ai_client.audio.speech.with_streaming_response.create(
-            **self.SPEECH_SETTINGS, input=input
-        ) as response:
-            file_name = f"{str(uuid.uuid4()).replace('-', '')}.mp3"
-            file_path = os.path.join(settings.MEDIA_ROOT, file_name)
-            response.stream_to_file(file_path)
+    def _generate_audio(self, input: str, language: str = None):
+        """
+        Speech for the text, synthesized only when the audio store misses
+        """
+        file_path = audio_store.lookup(input, language=language, **self.SPEECH_SETTINGS)
+        if file_path:
             return file_path
 
+        temp_path = audio_store.temp_path()
+        try:
+            with self.open_ai_client.audio.speech.with_streaming_response.create(
+                **self.SPEECH_SETTINGS, input=input
+            ) as response:
+                response.stream_to_file(temp_path)
+        except BaseException:
+            audio_store.discard(temp_path)
+            raise
+        return audio_store.commit(
+            temp_path, input, language=language, **self.SPEECH_SETTINGS
+        )
+
     def speech_to_speech(
         self, audio: io.BytesIO | str, source_lang: str, destination_lang: str
     ):
         if isinstance(audio, str):
-            with urlopen(audio) as response:
-                audio = io.BytesIO(response.read())
-                audio.name = "input.mp3"
-
-        transcribed_text = self._transcribe(audio)
+            with open(audio, "rb") as audio_file:
+                transcribed_text = self._transcribe(audio_file)
+        else:
+            transcribed_text = self._transcribe(audio)
         translated_text = self._translate(
             transcribed_text, source_lang, destination_lang
         )
-        return self._generate_audio(translated_text)
+        return self._generate_audio(translated_text, destination_lang)
 
     def text_to_text(self, input_text: str, source_lang: str, destination_lang: str):
         return self._translate(input_text, source_lang, destination_lang)
@@ -96,21 +194,52 @@ class ConversationUtil:
         "3": "Find nearest repair stations",
         "4": "Review Delivery Instructions",
     }
+    # Menu options answered by calling the tool handler directly
+    MENU_TOOL_MAP = {
+        "1": "get_route",
+        "2": "get_gas_stations",
+        "3": "get_repair_stations",
+        "4": "get_delivery_instructions",
+    }
+    PLACES_URL = "https://places.googleapis.com/v1/places:searchNearby"
+    PLACES_RADIUS = 5000
+    PLACES_RESULT_LIMIT = 3
+    FUEL_PLACE_TYPES = {"gas_station"}
+    # Tools answered with a corridor search, see `_prefetch_places`
+    PLACE_TOOLS = {
+        "get_gas_stations": "gas_station",
+        "get_repair_stations": "car_repair",
+    }
+
+    @classmethod
+    def fixed_messages(cls) -> list[str]:
+        """
+        Static reply strings, precomputed into the translation memory on deploy
+        """
+        return [
+            QUICK_HELP_MESSAGE,
+            *cls.SERVICE_OPTION_MAP.values(),
+            DELIVERY_INSTRUCTIONS.format(
+                origin=TODAYS_ROUTE[0], destination=TODAYS_ROUTE[1]
+            ),
+            *[
+                f"Your preferred language is set to {language.name.lower()}"
+                for language in Languages
+            ],
+        ]
 
     def __init_session(self):
-        self.messages = [{"role": SessionRole.SYSTEM.value, "content": AI_PROMPT}]
-        session_details = OpenAiConvSession.objects.filter(user=self.user).order_by(
-            "created_date"
-        )
-        for session in session_details.iterator():
-            self.messages.append({"role": session.role, "content": session.message})
+        self.context = ConversationContext(self.user)
+        self.messages = self.context.load()
 
     def __init__(self, user: str):
-        self.open_ai_client = OpenAI(api_key=settings.OPEN_AI_KEY)
+        self.open_ai_client = clients.openai()
         self.google_maps_api_key = settings.GOOGLE_MAPS_API_KEY
         self.fuel_origin = None
         self.fuel_destination = None
         self.user = user
+        self.pending_history: list[OpenAiConvSession] = []
+        self.prefetched_places: dict[tuple, list[dict]] = {}
         self.__init_session()
         self.translation_util = TranslationTranscriptionUtil()
 
@@ -120,60 +249,155 @@ class ConversationUtil:
         """
 
         function_name = tool_call.function.name
-        handler = getattr(self, f"handle_{function_name}")
+        handler = getattr(self, f"handle_{function_name}", None)
 
         if not handler:
             logger.error(
                 "Tool call not defined, returning generic message",
-                extra={"tool_call": tool_call, "client": self.gpt_client.pk},
+                extra={"tool_call": tool_call, "user": self.user},
             )
+            return ""
 
         return handler(**json.loads(tool_call.function.arguments))
 
+    def _run_tool_call(self, tool_call: ChatCompletionMessageToolCall):
+        try:
+            return self._process_tool_call(tool_call)
+        finally:
+            # Pool threads open their own DB connections
+            connections.close_all()
+
+    def _process_tool_calls(self, tool_calls: list[ChatCompletionMessageToolCall]):
+        """
+        Run every tool call of the turn concurrently on a bounded pool and
+        join the results, in the order of the calls, into one reply
+        """
+        if len(tool_calls) == 1:
+            return self._process_tool_call(tool_calls[0])
+
+        self._prefetch_places(tool_calls)
+        workers = min(len(tool_calls), settings.TOOL_CALL_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(self._run_tool_call, tool_calls))
+        return "\n\n".join(result for result in results if result)
+
     def _update_session_history(
         self,
         content: str | None,
         role: SessionRole,
     ):
         """
-        Update session history
+        Update session history, rows are written by `flush_session_history`
         """
         if not content:
             return
 
-        OpenAiConvSession.objects.create(
-            user=self.user, message=content, role=role.value
+        self.pending_history.append(
+            OpenAiConvSession(user=self.user, message=content, role=role.value)
         )
 
         self.messages.append({"role": role.value, "content": content})
 
+    def _corridor_requests(self, tool_calls: list[ChatCompletionMessageToolCall]):
+        """
+        Routes the turn asks both gas and repair stations for, with the
+        arguments of the gas station call
+        """
+        routes = {}
+        for tool_call in tool_calls:
+            if tool_call.function.name in self.PLACE_TOOLS:
+                arguments = json.loads(tool_call.function.arguments)
+                route = (arguments.get("origin"), arguments.get("destination"))
+                routes.setdefault(route, {})[tool_call.function.name] = arguments
+        return [
+            (*route, calls["get_gas_stations"])
+            for route, calls in routes.items()
+            if len(calls) == len(self.PLACE_TOOLS)
+        ]
+
+    @staticmethod
+    def _places_key(place_type: str, origin: str, destination: str, *arguments):
+        return (place_type, origin, destination, *arguments)
+
+    def _prefetch_places(self, tool_calls: list[ChatCompletionMessageToolCall]):
+        """
+        Look up gas and repair stations of a route together when the turn asks
+        for both, so they share one corridor search. The handlers pick the
+        results up from `prefetched_places`.
+        """
+        for origin, destination, arguments in self._corridor_requests(tool_calls):
+            max_diesel_price, count = (
+                arguments.get("max_diesel_price"),
+                arguments.get("count"),
+            )
+            gas_stations, repair_stations = self.find_gas_and_repair_stations(
+                origin, destination, max_diesel_price, count
+            )
+            self.prefetched_places[
+                self._places_key(
+                    "gas_station", origin, destination, max_diesel_price, count
+                )
+            ] = gas_stations
+            self.prefetched_places[
+                self._places_key("car_repair", origin, destination)
+            ] = repair_stations
+
+    def flush_session_history(self) -> int:
+        """
+        Write the history rows buffered during the turn with one bulk INSERT
+        """
+        rows, self.pending_history = self.pending_history, []
+        if rows:
+            OpenAiConvSession.objects.bulk_create(rows)
+        return len(rows)
+
+    def _completion_options(self) -> dict:
+        return {
+            "model": "gpt-4-turbo",
+            "messages": self.messages,
+            "max_tokens": 200,
+            "tools": TOOLS,
+        }
+
     def _get_gpt_response(self):
         """
         Get ai response based on the chat history
         """
 
-        return self.open_ai_client.chat.completions.create(
-            model="gpt-4-turbo",
-            messages=self.messages,
-            max_tokens=200,
-            tools=TOOLS,
-        )
+        return self.open_ai_client.chat.completions.create(**self._completion_options())
+
+    def _stream_gpt_response(self, on_chunk) -> tuple[list, str]:
+        """
+        Stream the completion and hand each finished sentence chunk, translated,
+        to `on_chunk`. Returns the tool calls, or the text not sent yet. Text
+        is held back as soon as the stream turns out to be a tool call.
+        """
+        chunker = SentenceChunker(settings.GPT_STREAM_MIN_CHUNK_CHARS)
+        collector = ToolCallCollector()
+        with self.open_ai_client.chat.completions.create(
+            **self._completion_options(), stream=True
+        ) as stream:
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta
+                if delta.tool_calls:
+                    collector.feed(delta.tool_calls)
+                elif delta.content and not collector.calls:
+                    for chunk in chunker.feed(delta.content):
+                        on_chunk(self.translate(chunk))
+        return collector.tool_calls(), chunker.flush()
 
     def handle_update_user_preference(self, language: str):
         """
         Tool handler function to change language
         """
+        if not language:
+            return None
+
         selected_language = Languages(language)
-        try:
-            existing_preference = UserPreference.objects.get(user=self.user)
-            if existing_preference.language == selected_language.value:
-                return None
-            existing_preference.language = selected_language.value
-            existing_preference.save()
-        except UserPreference.DoesNotExist:
-            UserPreference.objects.create(
-                user=self.user, language=selected_language.value
-            )
+        if not set_user_language(self.user, selected_language):
+            return None
 
         self._update_session_history(
             content="Updated user preference",
@@ -181,17 +405,25 @@ class ConversationUtil:
         )
         return f"Your preferred language is set to {selected_language.name.lower()}"
 
+    def route_briefing(self, origin: str, destination: str) -> str:
+        """
+        Route link, recommended fuel stop and delivery instructions
+        """
+        fuel_stops = self.find_fuel_stations(origin, destination, count=1)
+        route_message = self._format_route_message(
+            origin, destination, fuel_stops[0] if fuel_stops else None
+        )
+        instructions = self.delivery_instructions(origin, destination)
+        return f"{route_message}\n\n{instructions}"
+
     def handle_get_route(self, origin: str, destination: str):
         """
-        Tool handler function to get route
+        Tool handler function to get route, served from the precomputed
+        briefing when there is one
         """
-        route_map = self.generate_google_maps_link(origin, destination)
-        recommended_fuel_stop = self.get_gas_stations_on_route("Berlin", "Vienna")[0]
-        ai_response = f"""Route sent!\n\nPickUp: {origin} (9:00 AM),
-            \n\nDelivery: {destination} (5:00 PM)
-            \n{route_map}
-            \n\nRecommended Fuel Stop: {math.ceil(recommended_fuel_stop['distance'])}KMs ({recommended_fuel_stop['name']})
-            \nRoute: {recommended_fuel_stop['link']}"""
+        ai_response = get_briefing(
+            self.user, "en", origin, destination
+        ) or self.route_briefing(origin, destination)
 
         self._update_session_history(
             content=ai_response,
@@ -199,17 +431,26 @@ class ConversationUtil:
         )
         return ai_response
 
-    def handle_get_gas_stations(self, origin: str, destination: str):
+    def handle_get_gas_stations(
+        self,
+        origin: str,
+        destination: str,
+        max_diesel_price: float = None,
+        count: int = None,
+    ):
         ai_response = "Nearest fuel stations: "
 
-        gas_stations = self.get_gas_stations_on_route(origin, destination)
-        ai_response = ""
-        for station in gas_stations:
-            ai_response += (
-                f"Name: {station['name']} | {math.ceil(station['distance'])}Kms"
+        gas_stations = self.prefetched_places.pop(
+            self._places_key(
+                "gas_station", origin, destination, max_diesel_price, count
+            ),
+            None,
+        )
+        if gas_stations is None:
+            gas_stations = self.find_fuel_stations(
+                origin, destination, max_diesel_price, count
             )
-            ai_response += f"\n{station['link']}"
-            ai_response += "\n\n"
+        ai_response = self._format_stations("", gas_stations)
 
         self._update_session_history(
             content="Gas stations identified and send to user",
@@ -220,14 +461,14 @@ class ConversationUtil:
     def handle_get_repair_stations(self, origin: str, destination: str):
         ai_response = "Nearest repair stations: "
 
-        repair_stations = self.get_repair_shops_on_route(origin, destination)
-        if repair_stations:
-            for station in repair_stations:
-                ai_response += (
-                    f"Name: {station['name']} | {math.ceil(station['distance'])}Kms"
-                )
-                ai_response += f"\n{station['link']}"
-                ai_response += "\n\n"
+        repair_stations = self.prefetched_places.pop(
+            self._places_key("car_repair", origin, destination), None
+        )
+        if repair_stations is None:
+            repair_stations = self.search_places_along_route(
+                ["car_repair"], origin, destination
+            )["car_repair"]
+        ai_response = self._format_stations(ai_response, repair_stations)
 
         self._update_session_history(
             content="Repair stations identified and send to user",
@@ -235,67 +476,171 @@ class ConversationUtil:
         )
         return ai_response
 
-    def translate(self, message, direction: Literal["IN"] | Literal["OUT"] = "OUT"):
+    @staticmethod
+    def delivery_instructions(origin: str, destination: str) -> str:
         """
-        Translate to language configure by the user
+        Delivery instructions, the country specific ones only for today's route
         """
-        try:
-            language_preference_config = UserPreference.objects.get(user=self.user)
-            language = language_preference_config.language
-        except UserPreference.DoesNotExist:
-            language = "en"
+        route = (origin.strip().lower(), destination.strip().lower())
+        if route == tuple(place.lower() for place in TODAYS_ROUTE):
+            template = DELIVERY_INSTRUCTIONS
+        else:
+            template = GENERAL_DELIVERY_INSTRUCTIONS
+        return template.format(origin=origin, destination=destination)
+
+    def handle_get_delivery_instructions(self, origin: str, destination: str):
+        ai_response = self.delivery_instructions(origin, destination)
+
+        self._update_session_history(
+            content="Delivery instructions sent to user",
+            role=SessionRole.SYSTEM,
+        )
+        return ai_response
+
+    @staticmethod
+    def route_of(user: str) -> tuple[str, str] | None:
+        """
+        Origin and destination of the user's route for today, None for users
+        without a route
+        """
+        return TODAYS_ROUTE
+
+    def get_current_route(self) -> tuple[str, str]:
+        """
+        Origin and destination of the driver's route for today
+        """
+        return self.route_of(self.user)
+
+    def _language_pair(
+        self, language: str, direction: Literal["IN"] | Literal["OUT"]
+    ) -> tuple[str, str]:
+        """
+        Source and destination language for a translation direction
+        """
+        if direction == "IN":
+            return language, "en"
+        return "en", language
+
+    def translate_segments(
+        self,
+        segments: list[str],
+        direction: Literal["IN"] | Literal["OUT"] = "OUT",
+    ) -> list[str]:
+        """
+        Translate reply segments to or from the language configured by the user
+        in a single request
+        """
+        language = get_user_language(self.user)
 
         if language != "en":
-            if direction == "IN":
-                source_lang = language
-                destination_lang = "en"
-            else:
-                source_lang = "en"
-                destination_lang = language
-
-            message = self.translation_util.text_to_text(
-                message,
-                source_lang=source_lang,
-                destination_lang=destination_lang,
+            source_lang, destination_lang = self._language_pair(language, direction)
+            segments = self.translation_util._translate_batch(
+                segments, source_lang, destination_lang
             )
-        return message
+        return segments
 
-    def append_service_option_message(self, message: str):
+    def translate(self, message, direction: Literal["IN"] | Literal["OUT"] = "OUT"):
+        """
+        Translate to language configure by the user
+        """
+        return self.translate_segments([message], direction)[0]
+
+    def _service_option_segments(self) -> list[str]:
+        return [QUICK_HELP_MESSAGE, *self.SERVICE_OPTION_MAP.values()]
+
+    def _format_service_options(
+        self, message: str, header: str, options: list[str]
+    ) -> str:
         message += "\n\n"
-        message += self.translate("For quick help, select any of the option")
+        message += header
         message += "\n"
-        for key, value in self.SERVICE_OPTION_MAP.items():
-            message += f"{key}. {self.translate(value)}"
+        for key, option in zip(self.SERVICE_OPTION_MAP.keys(), options):
+            message += f"{key}. {option}"
             message += "\n"
         return message
 
-    def ai_response(self, message: str = None, media_url: str = None):
+    def append_service_option_message(self, message: str):
+        header, *options = self.translate_segments(self._service_option_segments())
+        return self._format_service_options(message, header, options)
+
+    def build_reply(self, message: str) -> str:
+        """
+        Translate the reply together with the option menu and join them
+        """
+        message, header, *options = self.translate_segments(
+            [message, *self._service_option_segments()]
+        )
+        return self._format_service_options(message, header, options)
+
+    def _localized_briefing(self, origin: str, destination: str) -> str | None:
+        """
+        Today's briefing already translated to the driver's language
+        """
+        language = get_user_language(self.user)
+        briefing = get_briefing(self.user, language, origin, destination)
+        if briefing:
+            self._update_session_history(content=briefing, role=SessionRole.SYSTEM)
+        return briefing
+
+    def menu_response(self, key: str) -> str:
+        """
+        Answer a menu pick with its tool handler, without an LLM round-trip.
+        The pick and the tool note are still recorded in the session history.
+        """
+        self._update_session_history(
+            content=self.SERVICE_OPTION_MAP[key],
+            role=SessionRole.USER,
+        )
+        origin, destination = self.get_current_route()
+        if self.MENU_TOOL_MAP[key] == "get_route":
+            briefing = self._localized_briefing(origin, destination)
+            if briefing:
+                return self.append_service_option_message(briefing)
+
+        handler = getattr(self, f"handle_{self.MENU_TOOL_MAP[key]}")
+        return self.build_reply(handler(origin, destination))
+
+    def ai_response(
+        self,
+        message: str = None,
+        media_url: str = None,
+        translated: bool = False,
+        on_chunk=None,
+    ):
         """Generates a trucking response and suggests refueling stations if applicable."""
 
-        message = self.translate(message, "IN")
+        if not translated:
+            message = self.translate(message, "IN")
         # Handle language selection
         self._update_session_history(
             content=message,
             role=SessionRole.USER,
         )
 
-        # Generate ai response
-        response = self._get_gpt_response()
-        if response.choices[0].message.tool_calls:
-            tool_call = response.choices[0].message.tool_calls[0]
-            message = self._process_tool_call(tool_call)
-            # Skip voice generation for tool output
-            message = self.translate(message)
-            return self.append_service_option_message(message), "text"
+        # Generate ai response, when streaming the text is sent sentence by
+        # sentence through on_chunk and only the rest is returned
+        if on_chunk and not media_url and settings.GPT_STREAMING:
+            tool_calls, message = self._stream_gpt_response(on_chunk)
         else:
+            response = self._get_gpt_response()
+            tool_calls = response.choices[0].message.tool_calls
             message = response.choices[0].message.content
 
-        message = self.translate(message)
+        if tool_calls:
+            message = self._process_tool_calls(tool_calls)
+            # Skip voice generation for tool output
+            return self.build_reply(message), "text"
+
         if media_url:
-            return self.translation_util._generate_audio(message), "audio"
+            message = self.translate(message)
+            return (
+                self.translation_util._generate_audio(
+                    message, get_user_language(self.user)
+                ),
+                "audio",
+            )
 
-        message = self.append_service_option_message(message)
-        return message, "text"
+        return self.build_reply(message), "text"
 
     def extract_locations(self, message: str):
         """Extracts origin and destination from the user's message using a basic pattern."""
@@ -315,33 +660,49 @@ class ConversationUtil:
         destination_encoded = urllib.parse.quote(destination)
         return f"{base_url}{origin_encoded}/{destination_encoded}/"
 
-    def get_gas_stations_on_route(self, origin: str, destination: str):
-        """Fetches gas stations along the route using the Google Places API."""
-        places_url = "https://places.googleapis.com/v1/places:searchNearby"
-
-        # Get midpoint between origin and destination (rough estimate)
-        midpoint = (
-            origin  # Simplified, ideally get a midpoint via Google Directions API
-        )
+    def _format_route_message(
+        self, origin: str, destination: str, recommended_fuel_stop: dict | None
+    ) -> str:
+        route_map = self.generate_google_maps_link(origin, destination)
+        route_message = f"""Route sent!\n\nPickUp: {origin} (9:00 AM),
+            \n\nDelivery: {destination} (5:00 PM)
+            \n{route_map}"""
+        if not recommended_fuel_stop:
+            return route_message
+        return f"""{route_message}
+            \n\nRecommended Fuel Stop: {math.ceil(recommended_fuel_stop['distance'])}KMs ({recommended_fuel_stop['name']})
+            \nRoute: {recommended_fuel_stop['link']}"""
 
-        geolocator = Nominatim(user_agent="geocoding_app")
-        location = geolocator.geocode(midpoint)
+    def _format_stations(self, ai_response: str, stations: list[dict]) -> str:
+        for station in stations:
+            ai_response += (
+                f"Name: {station['name']} | {math.ceil(station['distance'])}Kms"
+            )
+            if station.get("fuel_prices"):
+                ai_response += f" | {station['fuel_prices']}"
+            ai_response += f"\n{station['link']}"
+            ai_response += "\n\n"
+        return ai_response
 
+    def _places_request(self, place_type: str, location) -> tuple[dict, dict]:
+        """
+        Headers and payload for a Places nearby search around the location
+        """
         headers = {
             "Content-Type": "application/json",
             "X-Goog-Api-Key": self.google_maps_api_key,
-            "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.fuelOptions,routingSummaries.legs.distanceMeters",
+            "X-Goog-FieldMask": "places.id,places.displayName,places.formattedAddress,places.location,places.fuelOptions,routingSummaries.legs.distanceMeters",
         }
 
         payload = {
-            "includedTypes": ["gas_station"],
+            "includedTypes": [place_type],
             "locationRestriction": {
                 "circle": {
                     "center": {
                         "latitude": location.latitude,
                         "longitude": location.longitude,
                     },
-                    "radius": 5000,
+                    "radius": self.PLACES_RADIUS,
                 }
             },
             "routingParameters": {
@@ -352,106 +713,196 @@ class ConversationUtil:
                 "routingPreference": "TRAFFIC_AWARE",
             },
         }
+        return headers, payload
 
-        response = requests.post(places_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            gas_stations = []
-
-            places = data["places"][:3]
-            summaries = data["routingSummaries"][:3]
-            for i in range(len(places)):
-                place = places[i]
-                summary = summaries[i]
-
-                name = (
-                    place["displayName"]["text"]
-                    + " "
-                    + place["formattedAddress"].split(" ")[0]
+    def _parse_places(
+        self, data: dict, origin: str, require_fuel_prices: bool = False
+    ) -> list[dict]:
+        """
+        Convert a Places nearby search response into station dicts, the
+        distance is the drive from the search point on the route
+        """
+        stations = []
+
+        for place, summary in zip(
+            data.get("places", []), data.get("routingSummaries", [])
+        ):
+            name = (
+                place["displayName"]["text"]
+                + " "
+                + place["formattedAddress"].split(" ")[0]
+            )
+            station = {
+                "id": place["id"],
+                "name": name,
+                "distance": summary["legs"][0]["distanceMeters"] / 1000,
+                "link": self.generate_google_maps_link(origin, name),
+            }
+
+            fuel_options = place.get("fuelOptions")
+            if fuel_options:
+                fuel_prices = ", ".join(
+                    [
+                        f"{item['type']}: {money_amount(item['price']):.2f}€"
+                        for item in fuel_options["fuelPrices"]
+                        if "DIESEL" in item["type"]
+                    ]
                 )
-                fuel_station = {
-                    "name": name,
-                    "distance": summary["legs"][0]["distanceMeters"] / 1000,
-                    "link": self.generate_google_maps_link(midpoint, name),
-                }
+                station["fuel_prices"] = fuel_prices
 
-                fuel_options = place.get("fuelOptions")
-                if fuel_options:
-                    fuel_prices = ", ".join(
-                        [
-                            f"{item['type']}: {item['price']['nanos']/10000000}€"
-                            for item in fuel_options["fuelPrices"]
-                            if "DIESEL" in item["type"]
-                        ]
-                    )
-                    fuel_station["fuel_prices"] = fuel_prices
-
-                if "fuel_prices" in fuel_station:
-                    gas_stations.append(fuel_station)
-
-            return gas_stations
-        return []
-
-    def get_repair_shops_on_route(self, origin: str, destination: str):
-        places_url = "https://places.googleapis.com/v1/places:searchNearby"
-
-        # Get midpoint between origin and destination (rough estimate)
-        midpoint = (
-            origin  # Simplified, ideally get a midpoint via Google Directions API
-        )
+            if not require_fuel_prices or "fuel_prices" in station:
+                stations.append(station)
 
-        geolocator = Nominatim(user_agent="geocoding_app")
-        location = geolocator.geocode(midpoint)
+        return stations
 
-        headers = {
-            "Content-Type": "application/json",
-            "X-Goog-Api-Key": self.google_maps_api_key,
-            "X-Goog-FieldMask": "places.displayName,places.formattedAddress,places.fuelOptions,routingSummaries.legs.distanceMeters",
+    def _merge_places(
+        self, place_type: str, responses: list[dict | None], origin: str
+    ) -> list[dict]:
+        """
+        Dedupe stations found from several search points by place id and keep
+        the ones with the shortest detour
+        """
+        closest = {}
+        for data in responses:
+            stations = self._parse_places(
+                data or {}, origin, place_type in self.FUEL_PLACE_TYPES
+            )
+            for station in stations:
+                current = closest.get(station["id"])
+                if current is None or station["distance"] < current["distance"]:
+                    closest[station["id"]] = station
+
+        ranked = sorted(closest.values(), key=lambda station: station["distance"])
+        return ranked[: self.PLACES_RESULT_LIMIT]
+
+    def _search_nearby(
+        self, place_type: str, location, fetched: list = None
+    ) -> dict | None:
+        """
+        Places nearby search response for the cache cell around the location.
+        Responses that were not served from the cache are added to `fetched`.
+        """
+        key, center = places_cache.cell(place_type, location, self.PLACES_RADIUS)
+
+        def fetch():
+            headers, payload = self._places_request(place_type, center)
+            response = clients.http().post(
+                self.PLACES_URL,
+                json=payload,
+                headers=headers,
+                timeout=settings.HTTP_TIMEOUT,
+            )
+            data = response.json() if response.status_code == 200 else None
+            if fetched is not None:
+                fetched.append(data)
+            return data
+
+        return places_cache.get_or_fetch(key, fetch)
+
+    def search_places_along_route(
+        self, place_types: list[str], origin: str, destination: str
+    ) -> dict[str, list[dict]]:
+        """
+        Nearby searches around points sampled along the route, all place types
+        and points in one concurrent pass. Returns the ranked stations per type.
+        """
+        points = route_planner.sample_points(origin, destination)
+        searches = [
+            (place_type, point) for place_type in place_types for point in points
+        ]
+        responses = {place_type: [] for place_type in place_types}
+        fetched = {place_type: [] for place_type in place_types}
+        if searches:
+            workers = min(len(searches), settings.PLACES_SEARCH_CONCURRENCY)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                results = pool.map(
+                    lambda search: self._search_nearby(
+                        *search, fetched=fetched[search[0]]
+                    ),
+                    searches,
+                )
+                for (place_type, _), data in zip(searches, results):
+                    responses[place_type].append(data)
+
+        # Only new responses carry prices the catalogue has not seen yet
+        for place_type in self.FUEL_PLACE_TYPES.intersection(fetched):
+            if fetched[place_type]:
+                fuel_stations.record_places(fetched[place_type])
+
+        return {
+            place_type: self._merge_places(place_type, data, origin)
+            for place_type, data in responses.items()
         }
 
-        payload = {
-            "includedTypes": ["car_repair"],
-            "locationRestriction": {
-                "circle": {
-                    "center": {
-                        "latitude": location.latitude,
-                        "longitude": location.longitude,
-                    },
-                    "radius": 5000,
-                }
-            },
-            "routingParameters": {
-                "origin": {
-                    "latitude": location.latitude,
-                    "longitude": location.longitude,
-                },
-                "routingPreference": "TRAFFIC_AWARE",
-            },
+    def _catalogue_station(self, record, distance: float, origin: str) -> dict:
+        name = record.name + " " + record.address.split(" ")[0]
+        return {
+            "id": record.place_id,
+            "name": name,
+            "distance": distance,
+            "link": self.generate_google_maps_link(origin, name),
+            "fuel_prices": f"DIESEL: {record.diesel_price:.2f}€",
         }
 
-        response = requests.post(places_url, json=payload, headers=headers)
-        if response.status_code == 200:
-            data = response.json()
-            repair_stations = []
-
-            places = data["places"][:3]
-            summaries = data["routingSummaries"][:3]
-            for i in range(len(places)):
-                place = places[i]
-                summary = summaries[i]
-
-                name = (
-                    place["displayName"]["text"]
-                    + " "
-                    + place["formattedAddress"].split(" ")[0]
+    def find_fuel_stations(
+        self,
+        origin: str,
+        destination: str,
+        max_diesel_price: float = None,
+        count: int = None,
+    ) -> list[dict]:
+        """
+        Nearest stations along the route with diesel under the price, served
+        from the local catalogue. Places is only searched when the catalogue
+        prices near the route are stale or it knows no station there.
+        """
+        count = count or self.PLACES_RESULT_LIMIT
+        points = route_planner.sample_points(origin, destination)
+        stations = fuel_stations.nearest(
+            points,
+            count,
+            max_diesel_price,
+            refresh=lambda: self.search_places_along_route(
+                ["gas_station"], origin, destination
+            ),
+        )
+        return [
+            self._catalogue_station(record, distance, origin)
+            for record, distance in stations
+        ]
+
+    def find_gas_and_repair_stations(
+        self,
+        origin: str,
+        destination: str,
+        max_diesel_price: float = None,
+        count: int = None,
+    ) -> tuple[list[dict], list[dict]]:
+        """
+        Fuel stations from the catalogue and repair stations from Places. When
+        the catalogue needs fresh prices, both place types are fetched in one
+        concurrent corridor pass.
+        """
+        count = count or self.PLACES_RESULT_LIMIT
+        points = route_planner.sample_points(origin, destination)
+        found = {}
+
+        def refresh():
+            found.update(
+                self.search_places_along_route(
+                    ["gas_station", "car_repair"], origin, destination
                 )
-                fuel_station = {
-                    "name": name,
-                    "distance": summary["legs"][0]["distanceMeters"] / 1000,
-                    "link": self.generate_google_maps_link(midpoint, name),
-                }
-                repair_stations.append(fuel_station)
+            )
+
+        stations = fuel_stations.nearest(points, count, max_diesel_price, refresh)
+        if "car_repair" not in found:
+            found.update(
+                self.search_places_along_route(["car_repair"], origin, destination)
+            )
+        return [
+            self._catalogue_station(record, distance, origin)
+            for record, distance in stations
+        ], found["car_repair"]
 
-            return repair_stations
 
-        return []
+translation_memory.pin(ConversationUtil.fixed_messages())
@@ -0,0 +1,160 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+# Replies sent during the current turn, see ChatLog.turn
+_turn_replies: ContextVar[list | None] = ContextVar("turn_replies", default=None)
+
+
+class ChatLog:
+    """
+    Write-behind log of WhatsApp conversations, one row per turn with the
+    driver's message and the replies sent for it. Recording only
+    puts the row on a bounded in-process queue, a background thread writes
+    the rows with bulk_create once CHAT_LOG_BATCH_SIZE rows are waiting or
+    CHAT_LOG_FLUSH_INTERVAL seconds passed. Rows are dropped, never waited
+    for, when the queue is full.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue: queue.Queue | None = None
+        self._pid = None
+        self.counters = Counter(queued=0, written=0, dropped=0, errors=0, flushes=0)
+        atexit.register(self.flush)
+
+    def _ensure_worker(self) -> queue.Queue:
+        # A forked process gets its own queue and writer thread
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._queue = queue.Queue(maxsize=settings.CHAT_LOG_QUEUE_SIZE)
+                    threading.Thread(
+                        target=self._run, name="chat-log-writer", daemon=True
+                    ).start()
+                    self._pid = os.getpid()
+        return self._queue
+
+    def record(self, sender: str, message: str = "", response: str = ""):
+        """
+        Queue a message for writing, returns immediately
+        """
+        self._put(ChatMessage(sender=sender, message=message, response=response))
+
+    def _put(self, entry: ChatMessage):
+        try:
+            self._ensure_worker().put_nowait(entry)
+        except queue.Full:
+            self.counters["dropped"] += 1
+            logger.warning(
+                "Chat log queue is full, dropping message of %s", entry.sender
+            )
+            return
+        self.counters["queued"] += 1
+
+    @contextmanager
+    def turn(self, sender: str, message: str):
+        """
+        Record a conversation turn as one row, the inbound message with the
+        replies successfully sent while the block runs. Turns that raise are
+        not recorded, their retry records the turn once it succeeds.
+        """
+        entry = ChatMessage(sender=sender, message=message, response="")
+        replies = []
+        token = _turn_replies.set(replies)
+        try:
+            yield entry
+        finally:
+            _turn_replies.reset(token)
+        entry.response = "\n\n".join(replies)
+        self._put(entry)
+
+    @asynccontextmanager
+    async def aturn(self, sender: str, message: str):
+        with self.turn(sender, message) as entry:
+            yield entry
+
+    def record_reply(self, to: str, response: str):
+        """
+        Add a sent reply to the current turn, or record it on its own when it
+        was sent outside a turn (e.g. from the send message API)
+        """
+        replies = _turn_replies.get()
+        if replies is not None:
+            replies.append(response)
+        else:
+            self.record(sender=(to or "").replace("whatsapp:", ""), response=response)
+
+    def _run(self):
+        message_queue = self._queue
+        while True:
+            batch = []
+            flushed = None
+            deadline = None
+            while len(batch) < settings.CHAT_LOG_BATCH_SIZE:
+                timeout = deadline - time.monotonic() if deadline else None
+                if timeout is not None and timeout <= 0:
+                    break
+                try:
+                    item = message_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if isinstance(item, threading.Event):
+                    flushed = item
+                    break
+                batch.append(item)
+                # The interval starts with the first row of the batch
+                deadline = (
+                    deadline or time.monotonic() + settings.CHAT_LOG_FLUSH_INTERVAL
+                )
+            if batch:
+                self._write(batch)
+            if flushed:
+                flushed.set()
+
+    def _write(self, batch: list[ChatMessage]):
+        close_old_connections()
+        try:
+            ChatMessage.objects.bulk_create(batch)
+        except Exception:
+            logger.exception("Failed to write %s chat messages", len(batch))
+            self.counters["errors"] += len(batch)
+            return
+        self.counters["written"] += len(batch)
+        self.counters["flushes"] += 1
+
+    def flush(self, timeout: float = 5) -> bool:
+        """
+        Write everything queued so far and wait for it, e.g. on shutdown
+        """
+        if self._queue is None or self._pid != os.getpid():
+            return True
+
+        flushed = threading.Event()
+        try:
+            self._queue.put(flushed, timeout=timeout)
+        except queue.Full:
+            return False
+        return flushed.wait(timeout)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "depth": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+chat_log = ChatLog()
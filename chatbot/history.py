@@ -0,0 +1,119 @@
+import base64
+import csv
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatMessage
+
+HISTORY_FIELDS = ("id", "sender", "message", "response", "timestamp")
+
+
+class InvalidHistoryQuery(Exception):
+    pass
+
+
+def encode_cursor(row: dict) -> str:
+    """
+    Opaque cursor pointing after the row in (timestamp, id) order
+    """
+    raw = json.dumps([row["timestamp"].isoformat(), row["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        timestamp, pk = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(timestamp), int(pk)
+    except (ValueError, TypeError):
+        raise InvalidHistoryQuery("Invalid cursor")
+
+
+def _parse_time(params, name: str) -> datetime | None:
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise InvalidHistoryQuery(f"Invalid '{name}', expected an ISO 8601 datetime")
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def _parse_limit(params) -> int:
+    try:
+        limit = int(params.get("limit", settings.CHAT_HISTORY_PAGE_SIZE))
+    except ValueError:
+        raise InvalidHistoryQuery("Invalid 'limit', expected a number")
+    return max(1, min(limit, settings.CHAT_HISTORY_MAX_PAGE_SIZE))
+
+
+def history_queryset(params) -> QuerySet:
+    """
+    Chat messages newest first, filtered by `sender` and the `since` (inclusive)
+    to `until` (exclusive) time range. Only the listed columns are read.
+    """
+    queryset = ChatMessage.objects.order_by("-timestamp", "-id")
+    if params.get("sender"):
+        queryset = queryset.filter(sender=params["sender"])
+    since = _parse_time(params, "since")
+    if since:
+        queryset = queryset.filter(timestamp__gte=since)
+    until = _parse_time(params, "until")
+    if until:
+        queryset = queryset.filter(timestamp__lt=until)
+    return queryset.values(*HISTORY_FIELDS)
+
+
+def history_page(params) -> tuple[list[dict], str | None]:
+    """
+    One page of the history after `cursor` and the cursor of the next page.
+    Pages are read by keyset, so deep pages cost the same as the first one.
+    """
+    limit = _parse_limit(params)
+    queryset = history_queryset(params)
+    if params.get("cursor"):
+        timestamp, pk = decode_cursor(params["cursor"])
+        queryset = queryset.filter(
+            Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, id__lt=pk)
+        )
+
+    rows = list(queryset[: limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def export_ndjson(queryset: QuerySet):
+    for row in queryset.iterator(chunk_size=settings.CHAT_HISTORY_EXPORT_CHUNK_SIZE):
+        yield json.dumps(row, cls=DjangoJSONEncoder) + "\n"
+
+
+class _Echo:
+    """
+    File-like object handing rows written by csv.writer straight back
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_csv(queryset: QuerySet):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HISTORY_FIELDS)
+    for row in queryset.iterator(chunk_size=settings.CHAT_HISTORY_EXPORT_CHUNK_SIZE):
+        row["timestamp"] = row["timestamp"].isoformat()
+        yield writer.writerow([row[field] for field in HISTORY_FIELDS])
+
+
+# Export formats, streamed row by row with constant memory
+EXPORTS = {
+    "ndjson": (export_ndjson, "application/x-ndjson"),
+    "csv": (export_csv, "text/csv"),
+}
@@ -0,0 +1,81 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import InboundMessageStatus, WebhookReceipt
+
+PURGE_INTERVAL = 600
+
+_next_purge = 0.0
+
+
+def claim_webhook(message_sid: str | None) -> tuple[bool, WebhookReceipt | None]:
+    """
+    Claim an inbound message for processing. Returns whether this request owns
+    the message and its receipt, duplicates get the receipt of the first
+    delivery. Claims of failed or expired deliveries are taken over.
+    """
+    if not message_sid:
+        return True, None
+
+    now = timezone.now()
+    receipt, created = WebhookReceipt.objects.get_or_create(
+        message_sid=message_sid, defaults={"claimed_at": now}
+    )
+    if created:
+        _purge_expired()
+        return True, receipt
+
+    expired = now - timedelta(seconds=settings.WEBHOOK_CLAIM_TTL)
+    taken_over = (
+        WebhookReceipt.objects.filter(pk=receipt.pk)
+        .filter(
+            Q(status=InboundMessageStatus.FAILED)
+            | Q(status=InboundMessageStatus.PROCESSING, claimed_at__lt=expired)
+        )
+        .update(status=InboundMessageStatus.PROCESSING, claimed_at=now)
+    )
+    return bool(taken_over), receipt
+
+
+def complete_webhook(receipt: WebhookReceipt | None, response: str):
+    """
+    Store the reply of a processed message for duplicate deliveries
+    """
+    if receipt is None:
+        return
+    WebhookReceipt.objects.filter(pk=receipt.pk).update(
+        status=InboundMessageStatus.DONE,
+        response=response,
+        finished_at=timezone.now(),
+    )
+
+
+def release_webhook(receipt: WebhookReceipt | None):
+    """
+    Mark a claim as failed so Twilio's retry can process the message again
+    """
+    if receipt is None:
+        return
+    WebhookReceipt.objects.filter(pk=receipt.pk).update(
+        status=InboundMessageStatus.FAILED, finished_at=timezone.now()
+    )
+
+
+def purge_receipts() -> int:
+    """
+    Delete receipts older than WEBHOOK_RECEIPT_TTL_HOURS
+    """
+    cutoff = timezone.now() - timedelta(hours=settings.WEBHOOK_RECEIPT_TTL_HOURS)
+    deleted, _ = WebhookReceipt.objects.filter(claimed_at__lt=cutoff).delete()
+    return deleted
+
+
+def _purge_expired():
+    global _next_purge
+    if time.monotonic() >= _next_purge:
+        _next_purge = time.monotonic() + PURGE_INTERVAL
+        purge_receipts()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from chatbot.work_queue import WorkerPool
+
+
+class Command(BaseCommand):
+    help = "Process queued WhatsApp webhook messages with a pool of worker threads"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers", type=int, default=None, help="Number of worker threads"
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Seconds to wait when the queue is empty",
+        )
+
+    def handle(self, *args, **options):
+        pool = WorkerPool(
+            worker_count=options["workers"], poll_interval=options["poll_interval"]
+        )
+        pool.start()
+        self.stdout.write(f"Started {pool.worker_count} webhook workers")
+        try:
+            pool.wait()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping webhook workers")
+            pool.stop()
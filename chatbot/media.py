@@ -0,0 +1,167 @@
+import logging
+import os
+import time
+import uuid
+from collections import Counter
+
+import httpx
+from django.conf import settings
+
+from ai.clients import clients  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {
+    "audio/ogg": "ogg",
+    "audio/opus": "ogg",
+    "audio/mpeg": "mp3",
+    "audio/mp4": "m4a",
+    "audio/aac": "m4a",
+    "audio/amr": "amr",
+    "audio/wav": "wav",
+    "audio/webm": "webm",
+}
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+class MediaFetcher:
+    """
+    Downloads each Twilio media item once, streamed to disk under a size cap
+    and kept by MediaSid for MEDIA_CACHE_TTL seconds so retried webhooks do
+    not fetch it again
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.counters = Counter(hits=0, downloads=0, bytes=0, rejected=0)
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(settings.MEDIA_ROOT, settings.MEDIA_CACHE_DIR)
+
+    def _auth(self) -> tuple[str, str]:
+        return settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN
+
+    def path(self, media_url: str, content_type: str = None) -> str:
+        """
+        Cache path of the media item, named after its MediaSid. The extension
+        lets Whisper recognise the audio format.
+        """
+        media_sid = media_url.rstrip("/").rsplit("/", 1)[-1]
+        extension = EXTENSIONS.get((content_type or "").split(";")[0], "mp3")
+        return os.path.join(self.directory, f"{media_sid}.{extension}")
+
+    def _cached(self, path: str) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self.counters["hits"] += 1
+        return True
+
+    def _check_size(self, size: int | str | None):
+        if size is not None and int(size) > settings.MEDIA_MAX_BYTES:
+            self.counters["rejected"] += 1
+            raise MediaTooLarge(
+                f"Media is larger than {settings.MEDIA_MAX_BYTES} bytes"
+            )
+
+    def _temp_path(self, path: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        return f"{path}.{uuid.uuid4().hex}.part"
+
+    def _finish(self, temp_path: str, path: str, size: int):
+        os.replace(temp_path, path)
+        self.counters["downloads"] += 1
+        self.counters["bytes"] += size
+        self.prune()
+
+    def _discard(self, temp_path: str):
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+
+    def fetch(self, media_url: str, content_type: str = None) -> str:
+        """
+        Local path of the media item, downloaded on the first call
+        """
+        path = self.path(media_url, content_type)
+        if self._cached(path):
+            return path
+
+        temp_path = self._temp_path(path)
+        size = 0
+        try:
+            with clients.http().get(
+                media_url,
+                auth=self._auth(),
+                stream=True,
+                timeout=settings.HTTP_TIMEOUT,
+            ) as response:
+                response.raise_for_status()
+                self._check_size(response.headers.get("Content-Length"))
+                with open(temp_path, "wb") as media_file:
+                    for chunk in response.iter_content(self.CHUNK_SIZE):
+                        size += len(chunk)
+                        self._check_size(size)
+                        media_file.write(chunk)
+            self._finish(temp_path, path, size)
+        finally:
+            self._discard(temp_path)
+        return path
+
+    async def afetch(
+        self, media_url: str, http_client: httpx.AsyncClient, content_type: str = None
+    ) -> str:
+        path = self.path(media_url, content_type)
+        if self._cached(path):
+            return path
+
+        temp_path = self._temp_path(path)
+        size = 0
+        try:
+            async with http_client.stream(
+                "GET", media_url, auth=self._auth(), follow_redirects=True
+            ) as response:
+                response.raise_for_status()
+                self._check_size(response.headers.get("Content-Length"))
+                with open(temp_path, "wb") as media_file:
+                    async for chunk in response.aiter_bytes(self.CHUNK_SIZE):
+                        size += len(chunk)
+                        self._check_size(size)
+                        media_file.write(chunk)
+            self._finish(temp_path, path, size)
+        finally:
+            self._discard(temp_path)
+        return path
+
+    def prune(self) -> int:
+        """
+        Remove cached media older than MEDIA_CACHE_TTL
+        """
+        cutoff = time.time() - settings.MEDIA_CACHE_TTL
+        removed = 0
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith(".part") or entry.stat().st_mtime >= cutoff:
+                        continue
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except OSError:
+                        logger.exception("Could not remove %s", entry.path)
+        except FileNotFoundError:
+            pass
+        return removed
+
+    def stats(self) -> dict:
+        return dict(self.counters)
+
+
+media_fetcher = MediaFetcher()
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chatbot", "0003_inboundmessage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="WebhookReceipt",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("message_sid", models.CharField(max_length=64, unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("processing", "Processing"),
+                            ("done", "Done"),
+                            ("failed", "Failed"),
+                        ],
+                        default="processing",
+                        max_length=10,
+                    ),
+                ),
+                ("response", models.TextField(blank=True)),
+                ("claimed_at", models.DateTimeField()),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["claimed_at"], name="chatbot_web_claimed_e91982_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.7 on 2026-10-16 23:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("chatbot", "0004_webhookreceipt"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="chatmessage",
+            index=models.Index(
+                fields=["timestamp", "id"], name="chatbot_cha_timesta_ab91c7_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="chatmessage",
+            index=models.Index(
+                fields=["sender", "timestamp", "id"],
+                name="chatbot_cha_sender_6bfc53_idx",
+            ),
+        ),
+    ]
@@ -7,5 +7,66 @@ class ChatMessage(models.Model):
     response = models.TextField()
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp", "id"]),
+            models.Index(fields=["sender", "timestamp", "id"]),
+        ]
+
     def __str__(self):
         return f"{self.sender}: {self.message}"
+
+
+class InboundMessageStatus(models.TextChoices):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class InboundMessage(models.Model):
+    """
+    Webhook payload waiting to be processed by the worker pool
+    """
+
+    sender = models.CharField(max_length=200)
+    payload = models.JSONField()
+    status = models.CharField(
+        max_length=10,
+        choices=InboundMessageStatus.choices,
+        default=InboundMessageStatus.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "received_at"])]
+
+    def __str__(self):
+        return f"{self.sender}: {self.status}"
+
+
+class WebhookReceipt(models.Model):
+    """
+    Processing claim of a Twilio message by MessageSid, keeps the webhook reply
+    so retried deliveries are answered without running the turn again
+    """
+
+    message_sid = models.CharField(max_length=64, unique=True)
+    status = models.CharField(
+        max_length=10,
+        choices=InboundMessageStatus.choices,
+        default=InboundMessageStatus.PROCESSING,
+    )
+    response = models.TextField(blank=True)
+    claimed_at = models.DateTimeField()
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["claimed_at"])]
+
+    def __str__(self):
+        return f"{self.message_sid}: {self.status}"
@@ -7,3 +7,15 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = "__all__"
+
+
+class ChatMessageValuesSerializer(serializers.Serializer):
+    """
+    Read-only serializer for `.values()` rows of the chat history
+    """
+
+    id = serializers.IntegerField()
+    sender = serializers.CharField()
+    message = serializers.CharField()
+    response = serializers.CharField()
+    timestamp = serializers.DateTimeField()
@@ -0,0 +1,146 @@
+from ai.async_util import AsyncConversationUtil  # type: ignore
+from ai.util import ConversationUtil  # type: ignore
+
+from .chat_log import chat_log
+from .media import media_fetcher
+from .turns import turn_lock
+from .utils import asend_whatsapp_message, send_whatsapp_message
+
+
+def inbound_text(data) -> str:
+    """
+    Text of an inbound Twilio payload, the media URL for voice notes
+    """
+    return data.get("Body") or data.get("MediaUrl0") or ""
+
+
+def process_inbound_message(data):
+    """
+    Run a full conversation turn for an inbound Twilio payload and send the reply.
+
+    :param data: Twilio webhook form data (QueryDict or plain dict)
+    """
+    sender = data.get("From")
+    message = data.get("Body", "").strip().lower()  # Normalize message
+    message_type = data.get("MessageType")
+    user = sender.replace("whatsapp:", "")
+
+    with turn_lock.turn(user), chat_log.turn(user, inbound_text(data)) as chat:
+        util = ConversationUtil(user=user)
+        try:
+            if message_type == "text" and message in util.MENU_TOOL_MAP:
+                send_whatsapp_message(sender, util.menu_response(message))
+
+            elif message_type == "text":
+                detected_language = util.translation_util.detect_language(message)
+                language_update_message = util.handle_update_user_preference(
+                    detected_language
+                )
+                if language_update_message:
+                    send_whatsapp_message(
+                        sender, util.translate(language_update_message)
+                    )
+
+                message_response, type = util.ai_response(
+                    message=message,
+                    on_chunk=lambda chunk: send_whatsapp_message(sender, chunk),
+                )
+                send_whatsapp_message(sender, message_response)
+
+            elif message_type == "audio":
+                media_url = data.get("MediaUrl0")
+                media_path = media_fetcher.fetch(
+                    media_url, data.get("MediaContentType0")
+                )
+                transcript = util.translation_util.transcribe_audio(media_path)
+                chat.message = transcript.text
+                language_update_message = util.handle_update_user_preference(
+                    transcript.language
+                )
+                if language_update_message:
+                    send_whatsapp_message(
+                        sender, util.translate(language_update_message)
+                    )
+
+                message_response, type = util.ai_response(
+                    message=transcript.english or transcript.text,
+                    media_url=media_url,
+                    translated=transcript.english is not None,
+                )
+
+                if type == "audio":
+                    send_whatsapp_message(sender, file_path=message_response)
+                else:
+                    send_whatsapp_message(sender, message=message_response)
+        finally:
+            # History rows of the whole turn go out in one INSERT
+            util.flush_session_history()
+
+        # Fold old turns into the summary in the background
+        util.context.schedule_refresh()
+
+
+async def aprocess_inbound_message(data):
+    """
+    Async variant of process_inbound_message, used by the ASGI webhook.
+
+    :param data: Twilio webhook form data (QueryDict or plain dict)
+    """
+    sender = data.get("From")
+    message = data.get("Body", "").strip().lower()  # Normalize message
+    message_type = data.get("MessageType")
+    user = sender.replace("whatsapp:", "")
+
+    async with turn_lock.aturn(user), chat_log.aturn(user, inbound_text(data)) as chat:
+        util = await AsyncConversationUtil.create(user=user)
+        try:
+            if message_type == "text" and message in util.MENU_TOOL_MAP:
+                await asend_whatsapp_message(sender, await util.menu_response(message))
+
+            elif message_type == "text":
+                detected_language = await util.translation_util.detect_language(message)
+                language_update_message = await util.handle_update_user_preference(
+                    detected_language
+                )
+                if language_update_message:
+                    await asend_whatsapp_message(
+                        sender, await util.translate(language_update_message)
+                    )
+
+                message_response, type = await util.ai_response(
+                    message=message,
+                    on_chunk=lambda chunk: asend_whatsapp_message(sender, chunk),
+                )
+                await asend_whatsapp_message(sender, message_response)
+
+            elif message_type == "audio":
+                media_url = data.get("MediaUrl0")
+                media_path = await media_fetcher.afetch(
+                    media_url, util.http_client, data.get("MediaContentType0")
+                )
+                transcript = await util.translation_util.transcribe_audio(media_path)
+                chat.message = transcript.text
+                language_update_message = await util.handle_update_user_preference(
+                    transcript.language
+                )
+                if language_update_message:
+                    await asend_whatsapp_message(
+                        sender, await util.translate(language_update_message)
+                    )
+
+                message_response, type = await util.ai_response(
+                    message=transcript.english or transcript.text,
+                    media_url=media_url,
+                    translated=transcript.english is not None,
+                )
+
+                if type == "audio":
+                    await asend_whatsapp_message(sender, file_path=message_response)
+                else:
+                    await asend_whatsapp_message(sender, message=message_response)
+        finally:
+            # History rows of the whole turn go out in one INSERT
+            await util.flush_session_history()
+
+        # Fold old turns into the summary in the background
+        util.context.schedule_refresh()
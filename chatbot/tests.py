@@ -1 +1,438 @@
-# Create your tests here.
+import asyncio
+import json
+import threading
+from datetime import timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .chat_log import ChatLog
+from .idempotency import claim_webhook, purge_receipts
+from .models import ChatMessage, InboundMessage, InboundMessageStatus, WebhookReceipt
+from .turns import TurnLock
+from .work_queue import (
+    WorkerPool,
+    claim_next_message,
+    requeue_stale_messages,
+    run_inbound_message,
+)
+
+
+def inbound(sender: str, body: str, seconds_ago: float = 60) -> InboundMessage:
+    message = InboundMessage.objects.create(
+        sender=sender,
+        payload={"From": sender, "Body": body, "MessageType": "text"},
+    )
+    # received_at is auto_now_add, backdate it with an update
+    received_at = timezone.now() - timedelta(seconds=seconds_ago)
+    InboundMessage.objects.filter(pk=message.pk).update(received_at=received_at)
+    message.received_at = received_at
+    return message
+
+
+@override_settings(TURN_MERGE_WINDOW=0)
+class ClaimNextMessageTests(TestCase):
+    def test_claims_messages_of_a_driver_in_arrival_order(self):
+        first = inbound("whatsapp:+1", "first", seconds_ago=30)
+        second = inbound("whatsapp:+1", "second", seconds_ago=20)
+
+        claimed = claim_next_message()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, InboundMessageStatus.PROCESSING)
+        self.assertEqual(claimed.attempts, 1)
+
+        # The driver is busy until the first message is done
+        self.assertIsNone(claim_next_message())
+
+        claimed.status = InboundMessageStatus.DONE
+        claimed.save(update_fields=["status"])
+        self.assertEqual(claim_next_message().pk, second.pk)
+
+    def test_other_drivers_are_claimed_while_one_is_busy(self):
+        first = inbound("whatsapp:+1", "first", seconds_ago=30)
+        inbound("whatsapp:+1", "second", seconds_ago=20)
+        other = inbound("whatsapp:+2", "other", seconds_ago=10)
+
+        self.assertEqual(claim_next_message().pk, first.pk)
+        self.assertEqual(claim_next_message().pk, other.pk)
+        self.assertIsNone(claim_next_message())
+
+    def test_first_sent_message_is_claimed_before_older_timestamps(self):
+        # Rows of a driver are claimed by id, even when a later row has an
+        # earlier received_at
+        first = inbound("whatsapp:+1", "first", seconds_ago=10)
+        inbound("whatsapp:+1", "second", seconds_ago=30)
+
+        self.assertEqual(claim_next_message().pk, first.pk)
+        self.assertIsNone(claim_next_message())
+
+    @override_settings(TURN_MERGE_WINDOW=5)
+    def test_follow_up_texts_are_merged_into_one_turn(self):
+        first = inbound("whatsapp:+1", "Hi", seconds_ago=30)
+        second = inbound("whatsapp:+1", "where do I", seconds_ago=29)
+        third = inbound("whatsapp:+1", "park?", seconds_ago=28)
+        late = inbound("whatsapp:+1", "thanks", seconds_ago=10)
+
+        claimed = claim_next_message()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.payload["Body"], "Hi\nwhere do I\npark?")
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.payload["Body"], "Hi\nwhere do I\npark?")
+
+        for merged in (second, third):
+            merged.refresh_from_db()
+            self.assertEqual(merged.status, InboundMessageStatus.DONE)
+        late.refresh_from_db()
+        self.assertEqual(late.status, InboundMessageStatus.PENDING)
+
+    @override_settings(TURN_MERGE_WINDOW=5)
+    def test_menu_commands_are_not_merged(self):
+        first = inbound("whatsapp:+1", "Hi", seconds_ago=30)
+        menu = inbound("whatsapp:+1", "1", seconds_ago=29)
+        after_menu = inbound("whatsapp:+1", "thanks", seconds_ago=28)
+
+        claimed = claim_next_message()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.payload["Body"], "Hi")
+        for pending in (menu, after_menu):
+            pending.refresh_from_db()
+            self.assertEqual(pending.status, InboundMessageStatus.PENDING)
+
+    @override_settings(TURN_MERGE_WINDOW=5)
+    def test_messages_wait_for_the_merge_window(self):
+        inbound("whatsapp:+1", "Hi", seconds_ago=0)
+        self.assertIsNone(claim_next_message())
+
+
+@override_settings(
+    TURN_MERGE_WINDOW=0, WEBHOOK_WORKER_VISIBILITY_TIMEOUT=60, WEBHOOK_MAX_ATTEMPTS=2
+)
+class RequeueStaleMessagesTests(TestCase):
+    def processing(self, attempts: int, seconds_ago: float) -> InboundMessage:
+        message = inbound("whatsapp:+1", "Hi")
+        InboundMessage.objects.filter(pk=message.pk).update(
+            status=InboundMessageStatus.PROCESSING,
+            attempts=attempts,
+            started_at=timezone.now() - timedelta(seconds=seconds_ago),
+        )
+        return message
+
+    def test_stale_messages_are_requeued_and_claimed_again(self):
+        message = self.processing(attempts=1, seconds_ago=120)
+        self.assertIsNone(claim_next_message())
+
+        self.assertEqual(requeue_stale_messages(), 1)
+        claimed = claim_next_message()
+        self.assertEqual(claimed.pk, message.pk)
+        self.assertEqual(claimed.attempts, 2)
+
+    def test_recent_messages_stay_in_processing(self):
+        message = self.processing(attempts=1, seconds_ago=10)
+
+        self.assertEqual(requeue_stale_messages(), 0)
+        message.refresh_from_db()
+        self.assertEqual(message.status, InboundMessageStatus.PROCESSING)
+
+    def test_messages_out_of_attempts_are_failed(self):
+        message = self.processing(attempts=2, seconds_ago=120)
+
+        with self.assertLogs("chatbot.work_queue", "WARNING"):
+            self.assertEqual(requeue_stale_messages(), 0)
+        message.refresh_from_db()
+        self.assertEqual(message.status, InboundMessageStatus.FAILED)
+        self.assertIsNotNone(message.finished_at)
+
+    def test_worker_pool_requeues_periodically(self):
+        pool = WorkerPool(worker_count=1)
+        with mock.patch("chatbot.work_queue.requeue_stale_messages") as requeue:
+            pool._requeue_stale()
+            pool._requeue_stale()
+        self.assertEqual(requeue.call_count, 1)
+
+
+@override_settings(TURN_MERGE_WINDOW=0, WEBHOOK_MAX_ATTEMPTS=2)
+class RunInboundMessageTests(TestCase):
+    def test_successful_message_is_done(self):
+        inbound("whatsapp:+1", "Hi")
+        claimed = claim_next_message()
+
+        with mock.patch("chatbot.work_queue.process_inbound_message") as process:
+            run_inbound_message(claimed)
+
+        process.assert_called_once_with(claimed.payload)
+        claimed.refresh_from_db()
+        self.assertEqual(claimed.status, InboundMessageStatus.DONE)
+
+    def test_failed_message_is_retried_until_out_of_attempts(self):
+        inbound("whatsapp:+1", "Hi")
+        error = mock.patch(
+            "chatbot.work_queue.process_inbound_message",
+            side_effect=RuntimeError("boom"),
+        )
+
+        for status in (InboundMessageStatus.PENDING, InboundMessageStatus.FAILED):
+            claimed = claim_next_message()
+            with error, self.assertLogs("chatbot.work_queue", "ERROR"):
+                run_inbound_message(claimed)
+            claimed.refresh_from_db()
+            self.assertEqual(claimed.status, status)
+            self.assertEqual(claimed.error, "boom")
+
+        self.assertIsNone(claim_next_message())
+
+
+@override_settings(WEBHOOK_PROCESSING_MODE="inline", WEBHOOK_CLAIM_TTL=300)
+class WebhookDeduplicationTests(TestCase):
+    payload = {"MessageSid": "SM1", "From": "whatsapp:+1", "Body": "Hi"}
+
+    def post(self):
+        return self.client.post(reverse("whatsapp_webhook"), self.payload)
+
+    @mock.patch("chatbot.views.process_inbound_message")
+    def test_retried_delivery_is_answered_with_the_stored_reply(self, process):
+        first = self.post()
+        retry = self.post()
+
+        process.assert_called_once()
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.content, first.content)
+        receipt = WebhookReceipt.objects.get(message_sid="SM1")
+        self.assertEqual(receipt.status, InboundMessageStatus.DONE)
+
+    @mock.patch("chatbot.views.process_inbound_message")
+    def test_failed_delivery_is_processed_again(self, process):
+        process.side_effect = [RuntimeError("boom"), None]
+
+        with self.assertRaises(RuntimeError):
+            self.post()
+        self.assertEqual(
+            WebhookReceipt.objects.get(message_sid="SM1").status,
+            InboundMessageStatus.FAILED,
+        )
+
+        self.assertEqual(self.post().status_code, 200)
+        self.assertEqual(process.call_count, 2)
+        self.assertEqual(
+            WebhookReceipt.objects.get(message_sid="SM1").status,
+            InboundMessageStatus.DONE,
+        )
+
+    def test_expired_claim_is_taken_over(self):
+        self.assertTrue(claim_webhook("SM1")[0])
+        self.assertFalse(claim_webhook("SM1")[0])
+
+        WebhookReceipt.objects.filter(message_sid="SM1").update(
+            claimed_at=timezone.now() - timedelta(seconds=600)
+        )
+        self.assertTrue(claim_webhook("SM1")[0])
+
+    def test_messages_without_sid_are_always_processed(self):
+        self.assertEqual(claim_webhook(None), (True, None))
+        self.assertEqual(claim_webhook(None), (True, None))
+
+    @override_settings(WEBHOOK_RECEIPT_TTL_HOURS=24)
+    def test_old_receipts_are_purged(self):
+        claim_webhook("SM1")
+        claim_webhook("SM2")
+        WebhookReceipt.objects.filter(message_sid="SM1").update(
+            claimed_at=timezone.now() - timedelta(hours=25)
+        )
+
+        self.assertEqual(purge_receipts(), 1)
+        self.assertEqual(
+            list(WebhookReceipt.objects.values_list("message_sid", flat=True)),
+            ["SM2"],
+        )
+
+
+class ChatHistoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        now = timezone.now()
+        # Two messages share a timestamp, pages must still not skip either
+        for index, (sender, minutes_ago) in enumerate(
+            [("+1", 5), ("+2", 4), ("+1", 3), ("+1", 3), ("+2", 1)]
+        ):
+            message = ChatMessage.objects.create(
+                sender=sender, message=f"message {index}", response="ok"
+            )
+            ChatMessage.objects.filter(pk=message.pk).update(
+                timestamp=now - timedelta(minutes=minutes_ago)
+            )
+        cls.newest_first = list(
+            ChatMessage.objects.order_by("-timestamp", "-id").values_list(
+                "id", flat=True
+            )
+        )
+
+    def get(self, **params):
+        return self.client.get(reverse("chat_history"), params)
+
+    def test_pages_cover_every_message_once(self):
+        ids, cursor = [], None
+        while True:
+            params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+            page = self.get(**params).json()
+            self.assertLessEqual(len(page["results"]), 2)
+            ids += [row["id"] for row in page["results"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(ids, self.newest_first)
+
+    def test_filters_by_sender_and_time(self):
+        rows = self.get(sender="+1").json()["results"]
+        self.assertEqual({row["sender"] for row in rows}, {"+1"})
+        self.assertEqual(len(rows), 3)
+
+        since = (timezone.now() - timedelta(minutes=2)).isoformat()
+        rows = self.get(since=since).json()["results"]
+        self.assertEqual([row["id"] for row in rows], self.newest_first[:1])
+
+    def test_invalid_queries_are_rejected(self):
+        for params in ({"cursor": "nope"}, {"since": "yesterday"}, {"limit": "x"}):
+            self.assertEqual(self.get(**params).status_code, 400)
+        self.assertEqual(self.get(export="xml").status_code, 400)
+
+    def test_exports_stream_every_message(self):
+        response = self.get(export="ndjson", sender="+2")
+        rows = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual([row["sender"] for row in rows], ["+2", "+2"])
+
+        response = self.get(export="csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "id,sender,message,response,timestamp")
+        self.assertEqual(len(lines), 6)
+
+
+class ChatLogTests(SimpleTestCase):
+    def setUp(self):
+        self.chat_log = ChatLog()
+        patcher = mock.patch.object(self.chat_log, "_put")
+        self.put = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_turn_is_recorded_with_its_replies(self):
+        with self.chat_log.turn("+1", "Hi") as chat:
+            self.chat_log.record_reply("whatsapp:+1", "Hello")
+            self.chat_log.record_reply("whatsapp:+1", "How can I help?")
+            chat.message = "Hi there"
+
+        entry = self.put.call_args.args[0]
+        self.assertEqual(entry.sender, "+1")
+        self.assertEqual(entry.message, "Hi there")
+        self.assertEqual(entry.response, "Hello\n\nHow can I help?")
+
+    def test_failed_turn_is_not_recorded(self):
+        with self.assertRaises(RuntimeError):
+            with self.chat_log.turn("+1", "Hi"):
+                self.chat_log.record_reply("whatsapp:+1", "Hello")
+                raise RuntimeError("boom")
+
+        self.put.assert_not_called()
+
+        # Replies after the turn are recorded on their own
+        self.chat_log.record_reply("whatsapp:+1", "Later")
+        entry = self.put.call_args.args[0]
+        self.assertEqual((entry.sender, entry.response), ("+1", "Later"))
+
+    def test_failed_async_turn_is_not_recorded(self):
+        async def run():
+            async with self.chat_log.aturn("+1", "Hi"):
+                raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            asyncio.run(run())
+        self.put.assert_not_called()
+
+
+class TurnLockTests(SimpleTestCase):
+    def setUp(self):
+        self.turn_lock = TurnLock()
+        # The advisory lock goes through the database, these tests only cover
+        # the in-process locks
+        for name, value in (("_try_advisory_lock", True), ("_advisory_unlock", None)):
+            patcher = mock.patch.object(self.turn_lock, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def hold_turn(self, user: str):
+        """
+        Hold the turn of the user in another thread until the returned event is set
+        """
+        entered, release = threading.Event(), threading.Event()
+
+        def run():
+            with self.turn_lock.turn(user):
+                entered.set()
+                release.wait(5)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.assertTrue(entered.wait(5))
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(release.set)
+        return release
+
+    @override_settings(TURN_LOCK_TIMEOUT=5)
+    def test_turns_of_one_user_wait_for_each_other(self):
+        release = self.hold_turn("whatsapp:+1")
+        threading.Timer(0.1, release.set).start()
+
+        with self.turn_lock.turn("whatsapp:+1"):
+            self.assertTrue(release.is_set())
+
+        self.assertEqual(self.turn_lock.counters["waits"], 1)
+        self.assertEqual(self.turn_lock.counters["timeouts"], 0)
+        self.assertEqual(self.turn_lock.counters["turns"], 2)
+        self.assertEqual(self.turn_lock._advisory_unlock.call_count, 2)
+
+    @override_settings(TURN_LOCK_TIMEOUT=5)
+    def test_turns_of_other_users_do_not_wait(self):
+        self.hold_turn("whatsapp:+1")
+
+        with self.turn_lock.turn("whatsapp:+2"):
+            pass
+
+        self.assertEqual(self.turn_lock.counters["waits"], 0)
+        self.assertEqual(self.turn_lock.stats()["active_users"], 1)
+
+    @override_settings(TURN_LOCK_TIMEOUT=0.05)
+    def test_turn_runs_unlocked_after_timeout(self):
+        release = self.hold_turn("whatsapp:+1")
+
+        with self.assertLogs("chatbot.turns", "WARNING"):
+            with self.turn_lock.turn("whatsapp:+1"):
+                self.assertFalse(release.is_set())
+
+        self.assertEqual(self.turn_lock.counters["waits"], 1)
+        self.assertEqual(self.turn_lock.counters["timeouts"], 1)
+
+    @override_settings(TURN_LOCK_TIMEOUT=0.05)
+    def test_async_turn_runs_unlocked_after_timeout(self):
+        async def run():
+            release = asyncio.Event()
+
+            async def hold():
+                async with self.turn_lock.aturn("whatsapp:+1"):
+                    await release.wait()
+
+            holder = asyncio.create_task(hold())
+            await asyncio.sleep(0)
+            async with self.turn_lock.aturn("whatsapp:+1"):
+                self.assertFalse(release.is_set())
+            release.set()
+            await holder
+
+        with self.assertLogs("chatbot.turns", "WARNING"):
+            asyncio.run(run())
+
+        self.assertEqual(self.turn_lock.counters["waits"], 1)
+        self.assertEqual(self.turn_lock.counters["timeouts"], 1)
+        self.assertEqual(self.turn_lock.stats()["active_users"], 0)
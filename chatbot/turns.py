@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+
+class TurnLock:
+    """
+    Runs the conversation turns of one driver one at a time, so every turn
+    reads the history written by the previous one. Turns are serialized by a
+    per-user lock inside the process and a Postgres advisory lock across
+    processes, turns of different drivers stay fully parallel.
+
+    The locks only give mutual exclusion: waiting turns are not granted in
+    arrival order, and a turn still waiting after TURN_LOCK_TIMEOUT runs
+    without the lock. Strict arrival order comes from the worker queue,
+    which claims a driver's messages one at a time (see claim_next_message).
+    """
+
+    POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks: dict[str, list] = {}
+        self._async_locks: dict[str, list] = {}
+        self.counters = Counter(turns=0, waits=0, timeouts=0)
+
+    @staticmethod
+    def _advisory_key(user: str) -> int:
+        digest = hashlib.sha256(user.encode("utf-8")).digest()
+        return int.from_bytes(digest[:8], "big", signed=True)
+
+    def _try_advisory_lock(self, user: str) -> bool:
+        """
+        Take the advisory lock of the user without waiting, always granted on
+        databases without advisory locks
+        """
+        if connection.vendor != "postgresql":
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_try_advisory_lock(%s)", [self._advisory_key(user)]
+            )
+            return cursor.fetchone()[0]
+
+    def _advisory_lock(self, user: str, deadline: float) -> bool:
+        while not self._try_advisory_lock(user):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(self.POLL_INTERVAL)
+        return True
+
+    async def _aadvisory_lock(self, user: str, deadline: float) -> bool:
+        # Poll on the event loop, sleeping in the shared sync thread would
+        # stall every other database call
+        while not await sync_to_async(self._try_advisory_lock)(user):
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(self.POLL_INTERVAL)
+        return True
+
+    def _advisory_unlock(self, user: str):
+        if connection.vendor != "postgresql":
+            return
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [self._advisory_key(user)])
+
+    def _checkout(self, locks: dict, user: str, factory):
+        with self._lock:
+            entry = locks.setdefault(user, [factory(), 0])
+            entry[1] += 1
+            return entry[0]
+
+    def _checkin(self, locks: dict, user: str):
+        with self._lock:
+            entry = locks[user]
+            entry[1] -= 1
+            if not entry[1]:
+                del locks[user]
+
+    def _timed_out(self, user: str):
+        self.counters["timeouts"] += 1
+        logger.warning("Turn lock of %s timed out, running the turn anyway", user)
+
+    @contextmanager
+    def turn(self, user: str):
+        """
+        Hold the turn of the user for the duration of the block
+        """
+        deadline = time.monotonic() + settings.TURN_LOCK_TIMEOUT
+        lock = self._checkout(self._locks, user, threading.Lock)
+        locked = advisory = False
+        try:
+            locked = lock.acquire(blocking=False)
+            if not locked:
+                self.counters["waits"] += 1
+                locked = lock.acquire(timeout=settings.TURN_LOCK_TIMEOUT)
+            advisory = locked and self._advisory_lock(user, deadline)
+            if not advisory:
+                self._timed_out(user)
+            self.counters["turns"] += 1
+            yield
+        finally:
+            if advisory:
+                self._advisory_unlock(user)
+            if locked:
+                lock.release()
+            self._checkin(self._locks, user)
+
+    @asynccontextmanager
+    async def aturn(self, user: str):
+        deadline = time.monotonic() + settings.TURN_LOCK_TIMEOUT
+        lock = self._checkout(self._async_locks, user, asyncio.Lock)
+        locked = advisory = False
+        try:
+            if lock.locked():
+                self.counters["waits"] += 1
+                try:
+                    await asyncio.wait_for(lock.acquire(), settings.TURN_LOCK_TIMEOUT)
+                    locked = True
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                locked = await lock.acquire()
+            advisory = locked and await self._aadvisory_lock(user, deadline)
+            if not advisory:
+                self._timed_out(user)
+            self.counters["turns"] += 1
+            yield
+        finally:
+            if advisory:
+                await sync_to_async(self._advisory_unlock)(user)
+            if locked:
+                lock.release()
+            self._checkin(self._async_locks, user)
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "active_users": len(self._locks) + len(self._async_locks),
+        }
+
+
+turn_lock = TurnLock()
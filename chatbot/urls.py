@@ -1,9 +1,23 @@
 from django.urls import path
 
-from .views import ChatHistoryView, SendMessageView, WhatsAppWebhook
+from .views import (
+    AsyncWhatsAppWebhook,
+    CacheMetricsView,
+    ChatHistoryView,
+    QueueMetricsView,
+    SendMessageView,
+    WhatsAppWebhook,
+)
 
 urlpatterns = [
     path("whatsapp/", WhatsAppWebhook.as_view(), name="whatsapp_webhook"),
+    path(
+        "whatsapp-async/",
+        AsyncWhatsAppWebhook.as_view(),
+        name="whatsapp_webhook_async",
+    ),
     path("chat-history/", ChatHistoryView.as_view(), name="chat_history"),
     path("send-message/", SendMessageView.as_view(), name="send_message"),
+    path("queue-metrics/", QueueMetricsView.as_view(), name="queue_metrics"),
+    path("cache-metrics/", CacheMetricsView.as_view(), name="cache_metrics"),
 ]
@@ -1,8 +1,8 @@
-from base64 import b64encode
-
-import requests
 from django.conf import settings
-from twilio.rest import Client
+
+from ai.clients import clients
+
+from .chat_log import chat_log
 
 
 def send_whatsapp_message(to, message=None, file_path=None):
@@ -15,8 +15,9 @@ def send_whatsapp_message(to, message=None, file_path=None):
     if not message and not file_path:
         return
 
-    client = Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
+    client = clients.twilio()
     ngrok_url = settings.NGROK_URL
+    reply = message or f"{ngrok_url}/{file_path}"
 
     if message:
         message = client.messages.create(
@@ -24,10 +25,6 @@ def send_whatsapp_message(to, message=None, file_path=None):
             body=message,
             to=to,
         )
-        # TODO: Save chats in DB
-        # _ = ChatMessage.objects.create(
-        #     sender=sender, message=message, response=response_text
-        # )
 
     elif file_path:
         message = client.messages.create(
@@ -36,12 +33,39 @@ def send_whatsapp_message(to, message=None, file_path=None):
             to=to,
         )
 
+    # Only replies that went out are logged
+    chat_log.record_reply(to, reply)
     return message.sid
 
 
-def parse_media_uri(twilio_url: str):
-    auth_str = f"{settings.TWILIO_ACCOUNT_SID}:{settings.TWILIO_AUTH_TOKEN}"
-    auth_bytes = auth_str.encode("utf-8")
-    auth_b64 = b64encode(auth_bytes).decode("utf-8")
-    headers = {"Authorization": "Basic " + auth_b64}
-    return requests.get(twilio_url, headers=headers).url
+async def asend_whatsapp_message(to, message=None, file_path=None):
+    """
+    Sends a WhatsApp message using Twilio API without blocking the event loop.
+
+    :param to: Recipient WhatsApp number (e.g., 'whatsapp:+1234567890')
+    :param message: Message text
+    """
+    if not message and not file_path:
+        return
+
+    client = clients.async_twilio()
+    ngrok_url = settings.NGROK_URL
+    reply = message or f"{ngrok_url}/{file_path}"
+
+    if message:
+        message = await client.messages.create_async(
+            from_=settings.TWILIO_WHATSAPP_NUMBER,
+            body=message,
+            to=to,
+        )
+
+    elif file_path:
+        message = await client.messages.create_async(
+            from_=settings.TWILIO_WHATSAPP_NUMBER,
+            media_url=f"{ngrok_url}/{file_path}",
+            to=to,
+        )
+
+    # Only replies that went out are logged
+    chat_log.record_reply(to, reply)
+    return message.sid
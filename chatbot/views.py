@@ -1,7 +1,8 @@
-import io
-from urllib.request import urlopen
-
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils.decorators import method_decorator  # type: ignore
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt  # type: ignore
 from rest_framework import status  # type: ignore
 from rest_framework.response import Response  # type: ignore
@@ -9,11 +10,22 @@ from rest_framework.views import APIView  # type: ignore
 from transformers import pipeline  # type: ignore
 from twilio.twiml.messaging_response import MessagingResponse
 
-from ai.util import ConversationUtil  # type: ignore
-
-from .models import ChatMessage
-from .serializers import ChatMessageSerializer
-from .utils import parse_media_uri, send_whatsapp_message
+from ai.audio_store import audio_store  # type: ignore
+from ai.fuel_stations import fuel_stations  # type: ignore
+from ai.geocoding import geocoder  # type: ignore
+from ai.places import places_cache  # type: ignore
+from ai.routing import route_planner  # type: ignore
+from ai.translation_memory import translation_memory  # type: ignore
+
+from .chat_log import chat_log
+from .history import EXPORTS, InvalidHistoryQuery, history_page, history_queryset
+from .idempotency import claim_webhook, complete_webhook, release_webhook
+from .media import media_fetcher
+from .serializers import ChatMessageValuesSerializer
+from .tasks import aprocess_inbound_message, process_inbound_message
+from .turns import turn_lock
+from .utils import send_whatsapp_message
+from .work_queue import enqueue_inbound_message, queue_metrics
 
 # Temporary dictionary to store user language preferences (better to use a database)
 user_language_preferences: dict = {}
@@ -46,64 +58,108 @@ def generate_hindi_response(message):
 @method_decorator(csrf_exempt, name="dispatch")
 class WhatsAppWebhook(APIView):
     def post(self, request, *args, **kwargs):
-        sender = request.data.get("From")
+        claimed, receipt = claim_webhook(request.data.get("MessageSid"))
+        if not claimed:
+            # Retried delivery, answer with the stored reply
+            return Response(
+                receipt.response or str(MessagingResponse()),
+                content_type="text/xml",
+                status=status.HTTP_200_OK,
+            )
+
         message = request.data.get("Body", "").strip().lower()  # Normalize message
-        message_type = request.data.get("MessageType")
 
-        util = ConversationUtil(user=sender.replace("whatsapp:", ""))
         twilio_response = MessagingResponse()
         response_text = message  # Default response
 
-        if message_type == "text":
+        try:
+            if settings.WEBHOOK_PROCESSING_MODE == "queue":
+                enqueue_inbound_message(request.data)
+            else:
+                process_inbound_message(request.data)
+        except Exception:
+            release_webhook(receipt)
+            raise
 
-            if message in util.SERVICE_OPTION_MAP.keys():
-                message = util.translate(util.SERVICE_OPTION_MAP[message])
+        twilio_response.message(response_text)
+        complete_webhook(receipt, str(twilio_response))
+        return Response(
+            str(twilio_response), content_type="text/xml", status=status.HTTP_200_OK
+        )
 
-            detected_language = util.translation_util._detect_language(message)
-            language_update_message = util.handle_update_user_preference(
-                detected_language
-            )
-            if language_update_message:
-                send_whatsapp_message(sender, util.translate(language_update_message))
-
-            message_response, type = util.ai_response(message=message)
-            send_whatsapp_message(sender, message_response)
-
-        elif message_type == "audio":
-            media_url = parse_media_uri(request.data.get("MediaUrl0"))
-            with urlopen(media_url) as response:
-                audio = io.BytesIO(response.read())
-                audio.name = "input.mp3"
-                message = util.translation_util._transcribe(audio)
-                detected_language = util.translation_util._detect_language(message)
-                language_update_message = util.handle_update_user_preference(
-                    detected_language
-                )
-                if language_update_message:
-                    send_whatsapp_message(
-                        sender, util.translate(language_update_message)
-                    )
 
-            message_response, type = util.ai_response(
-                message=message, media_url=media_url
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncWhatsAppWebhook(View):
+    """
+    Async webhook for ASGI deployments, upstream calls for a turn run on the
+    event loop instead of holding a worker thread
+    """
+
+    async def post(self, request, *args, **kwargs):
+        claimed, receipt = await sync_to_async(claim_webhook)(
+            request.POST.get("MessageSid")
+        )
+        if not claimed:
+            # Retried delivery, answer with the stored reply
+            return HttpResponse(
+                receipt.response or str(MessagingResponse()), content_type="text/xml"
             )
 
-            if type == "audio":
-                send_whatsapp_message(sender, file_path=message_response)
+        message = request.POST.get("Body", "").strip().lower()  # Normalize message
+
+        twilio_response = MessagingResponse()
+        response_text = message  # Default response
+
+        try:
+            if settings.WEBHOOK_PROCESSING_MODE == "queue":
+                await sync_to_async(enqueue_inbound_message)(request.POST)
             else:
-                send_whatsapp_message(sender, message=message_response)
+                await aprocess_inbound_message(request.POST)
+        except Exception:
+            await sync_to_async(release_webhook)(receipt)
+            raise
 
         twilio_response.message(response_text)
-        return Response(
-            str(twilio_response), content_type="text/xml", status=status.HTTP_200_OK
-        )
+        await sync_to_async(complete_webhook)(receipt, str(twilio_response))
+        return HttpResponse(str(twilio_response), content_type="text/xml")
 
 
 class ChatHistoryView(APIView):
+    """
+    Chat messages newest first, a page at a time. Pass the `next_cursor` of a
+    page as `cursor` to get the next one, filter with `sender`, `since` and
+    `until`, or stream every matching message with `export=ndjson|csv`.
+    """
+
     def get(self, request):
-        messages = ChatMessage.objects.all().order_by("-timestamp")
-        serializer = ChatMessageSerializer(messages, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        params = request.query_params
+        try:
+            export = params.get("export")
+            if export:
+                if export not in EXPORTS:
+                    raise InvalidHistoryQuery(
+                        f"Invalid 'export', expected one of {', '.join(EXPORTS)}"
+                    )
+                stream, content_type = EXPORTS[export]
+                response = StreamingHttpResponse(
+                    stream(history_queryset(params)), content_type=content_type
+                )
+                response["Content-Disposition"] = (
+                    f'attachment; filename="chat-history.{export}"'
+                )
+                return response
+
+            rows, next_cursor = history_page(params)
+        except InvalidHistoryQuery as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {
+                "results": ChatMessageValuesSerializer(rows, many=True).data,
+                "next_cursor": next_cursor,
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class SendMessageView(APIView):
@@ -133,3 +189,39 @@ class SendMessageView(APIView):
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class QueueMetricsView(APIView):
+    """
+    Depth and wait-time metrics of the inbound webhook queue
+    """
+
+    def get(self, request):
+        return Response(
+            {
+                **queue_metrics(),
+                "turns": turn_lock.stats(),
+                "chat_log": chat_log.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
+class CacheMetricsView(APIView):
+    """
+    Hit/miss metrics of the in-process caches
+    """
+
+    def get(self, request):
+        return Response(
+            {
+                "translation_memory": translation_memory.stats(),
+                "geocoding": geocoder.stats(),
+                "places": places_cache.stats(),
+                "routes": route_planner.stats(),
+                "fuel_stations": fuel_stations.stats(),
+                "audio": audio_store.stats(),
+                "inbound_media": media_fetcher.stats(),
+            },
+            status=status.HTTP_200_OK,
+        )
@@ -0,0 +1,257 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Avg, Exists, F, Max, Min, OuterRef
+from django.utils import timezone
+
+from ai.util import ConversationUtil  # type: ignore
+
+from .models import InboundMessage, InboundMessageStatus
+from .tasks import process_inbound_message
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_inbound_message(data) -> InboundMessage:
+    """
+    Store the webhook payload so a worker can pick it up later
+    """
+    payload = data.dict() if hasattr(data, "dict") else dict(data)
+    return InboundMessage.objects.create(
+        sender=payload.get("From", ""), payload=payload
+    )
+
+
+def claim_next_message() -> InboundMessage | None:
+    """
+    Atomically claim the oldest pending message, skipping rows locked by other workers.
+    A driver's messages are claimed one at a time in arrival order, other
+    drivers' messages are picked up in parallel.
+    """
+    now = timezone.now()
+    busy_senders = InboundMessage.objects.filter(
+        status=InboundMessageStatus.PROCESSING
+    ).values("sender")
+    earlier_pending = InboundMessage.objects.filter(
+        sender=OuterRef("sender"),
+        status=InboundMessageStatus.PENDING,
+        id__lt=OuterRef("id"),
+    )
+    with transaction.atomic():
+        inbound = (
+            InboundMessage.objects.select_for_update(skip_locked=True)
+            .filter(
+                status=InboundMessageStatus.PENDING,
+                received_at__lte=now - timedelta(seconds=settings.TURN_MERGE_WINDOW),
+            )
+            .exclude(sender__in=busy_senders)
+            .exclude(Exists(earlier_pending))
+            .order_by("received_at", "id")
+            .first()
+        )
+        if not inbound:
+            return None
+
+        inbound.status = InboundMessageStatus.PROCESSING
+        inbound.attempts += 1
+        inbound.started_at = now
+        update_fields = ["status", "attempts", "started_at"]
+        if settings.TURN_MERGE_WINDOW and _merge_followups(inbound):
+            update_fields.append("payload")
+        inbound.save(update_fields=update_fields)
+        return inbound
+
+
+def _mergeable(payload: dict) -> bool:
+    body = payload.get("Body", "").strip().lower()
+    return payload.get("MessageType") == "text" and body not in (
+        ConversationUtil.MENU_TOOL_MAP
+    )
+
+
+def _merge_followups(inbound: InboundMessage) -> int:
+    """
+    Fold the text messages the driver sent within TURN_MERGE_WINDOW after
+    `inbound` into its body, so they are answered in a single turn
+    """
+    if not _mergeable(inbound.payload):
+        return 0
+
+    followups = []
+    for followup in (
+        InboundMessage.objects.select_for_update(skip_locked=True)
+        .filter(
+            sender=inbound.sender,
+            status=InboundMessageStatus.PENDING,
+            id__gt=inbound.id,
+            received_at__lte=inbound.received_at
+            + timedelta(seconds=settings.TURN_MERGE_WINDOW),
+        )
+        .order_by("received_at", "id")
+    ):
+        if not _mergeable(followup.payload):
+            break
+        followups.append(followup)
+    if not followups:
+        return 0
+
+    inbound.payload["Body"] = "\n".join(
+        message.payload.get("Body", "") for message in [inbound, *followups]
+    )
+    InboundMessage.objects.filter(pk__in=[message.pk for message in followups]).update(
+        status=InboundMessageStatus.DONE,
+        started_at=inbound.started_at,
+        finished_at=inbound.started_at,
+    )
+    return len(followups)
+
+
+def requeue_stale_messages() -> int:
+    """
+    Return messages stuck in processing (e.g. after a worker crash) to the queue.
+    Messages that already used WEBHOOK_MAX_ATTEMPTS are failed instead, so a
+    message that kills its worker is not retried forever.
+    """
+    now = timezone.now()
+    stale = InboundMessage.objects.filter(
+        status=InboundMessageStatus.PROCESSING,
+        started_at__lt=now
+        - timedelta(seconds=settings.WEBHOOK_WORKER_VISIBILITY_TIMEOUT),
+    )
+    failed = stale.filter(attempts__gte=settings.WEBHOOK_MAX_ATTEMPTS).update(
+        status=InboundMessageStatus.FAILED,
+        error="Processing timed out",
+        finished_at=now,
+    )
+    if failed:
+        logger.warning("Failed %s inbound messages that timed out too often", failed)
+    return stale.update(status=InboundMessageStatus.PENDING)
+
+
+def run_inbound_message(inbound: InboundMessage):
+    """
+    Process a claimed message and record the outcome
+    """
+    try:
+        process_inbound_message(inbound.payload)
+    except Exception as e:
+        logger.exception("Failed to process inbound message %s", inbound.pk)
+        inbound.error = str(e)
+        inbound.status = (
+            InboundMessageStatus.FAILED
+            if inbound.attempts >= settings.WEBHOOK_MAX_ATTEMPTS
+            else InboundMessageStatus.PENDING
+        )
+    else:
+        inbound.error = ""
+        inbound.status = InboundMessageStatus.DONE
+
+    inbound.finished_at = timezone.now()
+    inbound.save(update_fields=["status", "error", "finished_at"])
+
+
+def queue_metrics() -> dict:
+    """
+    Queue depth and wait-time metrics for monitoring
+    """
+    now = timezone.now()
+    pending = InboundMessage.objects.filter(status=InboundMessageStatus.PENDING)
+    oldest_pending = pending.aggregate(oldest=Min("received_at"))["oldest"]
+
+    recent = InboundMessage.objects.filter(
+        status=InboundMessageStatus.DONE,
+        finished_at__gte=now - timedelta(minutes=5),
+    ).aggregate(
+        avg_wait=Avg(F("started_at") - F("received_at")),
+        max_wait=Max(F("started_at") - F("received_at")),
+        avg_processing=Avg(F("finished_at") - F("started_at")),
+    )
+
+    def seconds(value):
+        return value.total_seconds() if value is not None else None
+
+    return {
+        "pending": pending.count(),
+        "processing": InboundMessage.objects.filter(
+            status=InboundMessageStatus.PROCESSING
+        ).count(),
+        "failed": InboundMessage.objects.filter(
+            status=InboundMessageStatus.FAILED
+        ).count(),
+        "oldest_pending_age": seconds(now - oldest_pending) if oldest_pending else 0,
+        "avg_wait_seconds": seconds(recent["avg_wait"]),
+        "max_wait_seconds": seconds(recent["max_wait"]),
+        "avg_processing_seconds": seconds(recent["avg_processing"]),
+    }
+
+
+class WorkerPool:
+    """
+    Pool of worker threads draining the DB-backed inbound message queue.
+    Run several processes with this pool to scale out, rows are claimed with
+    SKIP LOCKED so workers never pick the same message.
+    """
+
+    REQUEUE_INTERVAL = 30
+
+    def __init__(self, worker_count: int = None, poll_interval: float = None):
+        self.worker_count = worker_count or settings.WEBHOOK_WORKER_COUNT
+        self.poll_interval = poll_interval or settings.WEBHOOK_WORKER_POLL_INTERVAL
+        self._stop_event = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._next_requeue = 0.0
+
+    def _requeue_stale(self):
+        """
+        Requeue stale messages every REQUEUE_INTERVAL seconds, so a driver whose
+        message was left in processing by a dead worker is not blocked
+        """
+        with self._lock:
+            if time.monotonic() < self._next_requeue:
+                return
+            self._next_requeue = time.monotonic() + self.REQUEUE_INTERVAL
+        try:
+            requeue_stale_messages()
+        except Exception:
+            logger.exception("Failed to requeue stale inbound messages")
+
+    def _work(self):
+        while not self._stop_event.is_set():
+            close_old_connections()
+            self._requeue_stale()
+            try:
+                inbound = claim_next_message()
+            except Exception:
+                logger.exception("Failed to claim inbound message")
+                inbound = None
+
+            if not inbound:
+                self._stop_event.wait(self.poll_interval)
+                continue
+
+            run_inbound_message(inbound)
+
+        close_old_connections()
+
+    def start(self):
+        for index in range(self.worker_count):
+            thread = threading.Thread(
+                target=self._work, name=f"webhook-worker-{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def wait(self):
+        for thread in self._threads:
+            thread.join()
@@ -160,3 +160,138 @@ STATTC_URL = "/static/"
 GOOGLE_SERVICE_JSON = json.loads(os.getenv("GOOGLE_SERVICE_JSON", "{}"))
 GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
 NGROK_URL = os.getenv("NGROK_URL")
+
+# Webhook processing, "inline" runs the turn in the request, "queue" stores the
+# payload and lets `manage.py run_webhook_workers` process it
+WEBHOOK_PROCESSING_MODE = os.getenv("WEBHOOK_PROCESSING_MODE", "inline")
+WEBHOOK_WORKER_COUNT = int(os.getenv("WEBHOOK_WORKER_COUNT", "4"))
+WEBHOOK_WORKER_POLL_INTERVAL = float(os.getenv("WEBHOOK_WORKER_POLL_INTERVAL", "0.5"))
+WEBHOOK_WORKER_VISIBILITY_TIMEOUT = int(
+    os.getenv("WEBHOOK_WORKER_VISIBILITY_TIMEOUT", "300")
+)
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "3"))
+
+# Shared upstream clients (OpenAI, Google, Twilio), see ai.clients
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "20"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+CLIENT_REGISTRY_WARMUP = os.getenv("CLIENT_REGISTRY_WARMUP", "true").lower() == "true"
+
+# Conversation context sent to the LLM, see ai.context
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+CONTEXT_SUMMARY_WORKERS = int(os.getenv("CONTEXT_SUMMARY_WORKERS", "2"))
+CONTEXT_SUMMARY_MAX_ROWS = int(os.getenv("CONTEXT_SUMMARY_MAX_ROWS", "50"))
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+SESSION_ARCHIVE_AFTER_DAYS = int(os.getenv("SESSION_ARCHIVE_AFTER_DAYS", "30"))
+
+# Local cache, set CACHE_BACKEND to django.core.cache.backends.filebased.FileBasedCache
+# and CACHE_LOCATION to a directory to share it between worker processes
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "whatsapp-chatbot"),
+    }
+}
+PREFERENCE_CACHE_TIMEOUT = int(os.getenv("PREFERENCE_CACHE_TIMEOUT", "3600"))
+
+# Translation memory, see ai.translation_memory
+TRANSLATION_MEMORY_LRU_SIZE = int(os.getenv("TRANSLATION_MEMORY_LRU_SIZE", "4096"))
+TRANSLATION_MEMORY_LRU_TTL = int(os.getenv("TRANSLATION_MEMORY_LRU_TTL", "3600"))
+TRANSLATION_MEMORY_TTL_DAYS = int(os.getenv("TRANSLATION_MEMORY_TTL_DAYS", "90"))
+TRANSLATION_MEMORY_MAX_ROWS = int(os.getenv("TRANSLATION_MEMORY_MAX_ROWS", "100000"))
+# Only english strings up to this length, and the fixed messages, are stored in
+# the table; eviction runs every TRANSLATION_MEMORY_EVICT_EVERY written rows
+TRANSLATION_MEMORY_PERSIST_MAX_CHARS = int(
+    os.getenv("TRANSLATION_MEMORY_PERSIST_MAX_CHARS", "80")
+)
+TRANSLATION_MEMORY_EVICT_EVERY = int(os.getenv("TRANSLATION_MEMORY_EVICT_EVERY", "500"))
+
+# Language detection, inputs with fewer letters keep the stored language and
+# the remote detector is only used below the local confidence threshold
+LANGUAGE_DETECTION_MIN_CHARS = int(os.getenv("LANGUAGE_DETECTION_MIN_CHARS", "6"))
+LANGUAGE_DETECTION_CONFIDENCE = float(os.getenv("LANGUAGE_DETECTION_CONFIDENCE", "0.9"))
+
+# Geocoding, see ai.geocoding. The gazetteer is an optional CSV file with
+# name,latitude,longitude columns loaded into memory on first use
+GEOCODING_MEMORY_CACHE_SIZE = int(os.getenv("GEOCODING_MEMORY_CACHE_SIZE", "4096"))
+GEOCODING_MEMORY_CACHE_TTL = int(os.getenv("GEOCODING_MEMORY_CACHE_TTL", "86400"))
+GEOCODING_DB_CACHE_TTL_DAYS = int(os.getenv("GEOCODING_DB_CACHE_TTL_DAYS", "180"))
+GEOCODING_GAZETTEER_PATH = os.getenv("GEOCODING_GAZETTEER_PATH")
+GEOCODING_MIN_DELAY_SECONDS = float(os.getenv("GEOCODING_MIN_DELAY_SECONDS", "1"))
+
+# Places nearby search cache, see ai.places. Searches are snapped to cells of
+# PLACES_CELL_SIZE_DEGREES (0.01 is roughly 1km), fuel prices age out sooner
+PLACES_CACHE_SIZE = int(os.getenv("PLACES_CACHE_SIZE", "2048"))
+PLACES_CACHE_TTL = int(os.getenv("PLACES_CACHE_TTL", "3600"))
+PLACES_FUEL_PRICE_TTL = int(os.getenv("PLACES_FUEL_PRICE_TTL", "900"))
+PLACES_CELL_SIZE_DEGREES = float(os.getenv("PLACES_CELL_SIZE_DEGREES", "0.01"))
+
+# Corridor search, see ai.routing. Nearby searches run around up to
+# PLACES_ROUTE_MAX_SAMPLES points spread along the route polyline
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "512"))
+ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", "3600"))
+PLACES_ROUTE_SAMPLE_SPACING_KM = float(
+    os.getenv("PLACES_ROUTE_SAMPLE_SPACING_KM", "50")
+)
+PLACES_ROUTE_MAX_SAMPLES = int(os.getenv("PLACES_ROUTE_MAX_SAMPLES", "8"))
+PLACES_SEARCH_CONCURRENCY = int(os.getenv("PLACES_SEARCH_CONCURRENCY", "8"))
+
+# Fuel station catalogue, see ai.fuel_stations. Prices older than
+# FUEL_PRICE_MAX_AGE_HOURS are stale and trigger a Places search
+FUEL_PRICE_MAX_AGE_HOURS = float(os.getenv("FUEL_PRICE_MAX_AGE_HOURS", "6"))
+FUEL_STATION_MAX_DISTANCE_KM = float(os.getenv("FUEL_STATION_MAX_DISTANCE_KM", "10"))
+FUEL_STATION_GRID_DEGREES = float(os.getenv("FUEL_STATION_GRID_DEGREES", "0.1"))
+FUEL_STATION_INDEX_TTL = int(os.getenv("FUEL_STATION_INDEX_TTL", "300"))
+
+# Synthesized speech store under MEDIA_ROOT, see ai.audio_store. Above the
+# quota the least recently used files are removed down to the low watermark
+TTS_STORE_DIR = os.getenv("TTS_STORE_DIR", "tts")
+TTS_STORE_MAX_BYTES = int(os.getenv("TTS_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+TTS_STORE_LOW_WATERMARK = float(os.getenv("TTS_STORE_LOW_WATERMARK", "0.8"))
+
+# Inbound media, see chatbot.media. Items are kept by MediaSid for retries
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", "inbound")
+MEDIA_CACHE_TTL = int(os.getenv("MEDIA_CACHE_TTL", "3600"))
+MEDIA_MAX_BYTES = int(os.getenv("MEDIA_MAX_BYTES", str(16 * 1024 * 1024)))
+
+# Voice notes: also request Whisper's english translation in parallel with
+# the transcription instead of translating the transcript with Google
+WHISPER_TRANSLATE = os.getenv("WHISPER_TRANSLATE", "false").lower() == "true"
+
+# Stream text replies and send them sentence by sentence, chunks are at least
+# GPT_STREAM_MIN_CHUNK_CHARS long so short answers still go out as one message
+GPT_STREAMING = os.getenv("GPT_STREAMING", "false").lower() == "true"
+GPT_STREAM_MIN_CHUNK_CHARS = int(os.getenv("GPT_STREAM_MIN_CHUNK_CHARS", "160"))
+
+# Tool calls of one turn run concurrently, at most this many at a time
+TOOL_CALL_CONCURRENCY = int(os.getenv("TOOL_CALL_CONCURRENCY", "4"))
+
+# Webhook idempotency, see chatbot.idempotency. A claim that is still processing
+# after WEBHOOK_CLAIM_TTL seconds may be taken over by a retried delivery
+WEBHOOK_CLAIM_TTL = int(os.getenv("WEBHOOK_CLAIM_TTL", "300"))
+WEBHOOK_RECEIPT_TTL_HOURS = int(os.getenv("WEBHOOK_RECEIPT_TTL_HOURS", "24"))
+
+# Turns of one driver run one at a time, see chatbot.turns. Inline turns
+# are not ordered and run unlocked after TURN_LOCK_TIMEOUT seconds, only
+# the worker queue answers a driver's messages in arrival order. Queued
+# text messages sent within TURN_MERGE_WINDOW seconds are answered as one
+# turn, which delays every queued message by the window
+TURN_LOCK_TIMEOUT = float(os.getenv("TURN_LOCK_TIMEOUT", "120"))
+TURN_MERGE_WINDOW = float(os.getenv("TURN_MERGE_WINDOW", "0"))
+
+# Chat message log, see chatbot.chat_log. Rows are written in batches by a
+# background thread, at most CHAT_LOG_QUEUE_SIZE rows wait in memory
+CHAT_LOG_QUEUE_SIZE = int(os.getenv("CHAT_LOG_QUEUE_SIZE", "10000"))
+CHAT_LOG_BATCH_SIZE = int(os.getenv("CHAT_LOG_BATCH_SIZE", "200"))
+CHAT_LOG_FLUSH_INTERVAL = float(os.getenv("CHAT_LOG_FLUSH_INTERVAL", "1"))
+
+# Chat history API, pages are read by (timestamp, id) keyset and exports are
+# streamed from the database in chunks
+CHAT_HISTORY_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_PAGE_SIZE", "50"))
+CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv("CHAT_HISTORY_MAX_PAGE_SIZE", "500"))
+CHAT_HISTORY_EXPORT_CHUNK_SIZE = int(
+    os.getenv("CHAT_HISTORY_EXPORT_CHUNK_SIZE", "2000")
+)